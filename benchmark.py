@@ -0,0 +1,257 @@
+"""
+Benchmark file responsible for measuring the game logic
+this file plays many simulated games, without any real connections or
+real waiting, and reports how quickly the server got through them.
+it can also compare how long each codec takes to encode common messages,
+and how large they are, and how much cpu each compression setting uses
+to save how much bandwidth
+this file is run by hand, and is not used when the server is deployed
+"""
+
+import argparse
+import asyncio
+import gc
+import sys
+import timeit
+import time
+import tracemalloc
+from websockets.frames import Frame, OP_TEXT
+from classes.Simulation import Simulation, RandomGuesser, ScriptedGuesser
+from classes.Codec import json_codec, compact_codec
+from classes.Roster import Roster
+from classes.Compression import Compression, compress_threshold
+
+guessers = {"random": RandomGuesser, "scripted": ScriptedGuesser}
+codecs = {"json": json_codec, "compact": compact_codec}
+
+
+class Recipient:
+    """
+    stands in for a client when encoding a roster
+    """
+    def __init__(self, codec):
+        self.codec = codec
+
+
+# returns the messages to compare the codecs with, as (name, function)
+# pairs. Each function encodes its message with a codec, and returns
+# the encoded messages. Rosters are encoded for every player at once, as
+# the server does
+def get_samples():
+    players = [
+        {"NAME": f"player{number}", "SCORE": number * 1500}
+        for number in range(4)
+    ]
+    roster = Roster("GAME", "GAME_CONNECTED_UPDATE", turns=True)
+
+    def encode_roster(codec):
+        members = [(Recipient(codec), entry) for entry in players]
+        return [
+            message for _, message in roster.encode_legacy(
+                members, members[1][0], [client for client, _ in members]
+            )
+        ]
+
+    rooms = {
+        "TYPE": "LOAD_ROOMS",
+        "DATA": [
+            {"NAME": f"room {number}", "HASH": f"{number:012x}", "PLAYERS": 2}
+            for number in range(50)
+        ],
+        "VERSION": 1,
+    }
+    messages = {
+        "UPDATE_PHRASE": {
+            "TYPE": "UPDATE_PHRASE",
+            "DATA": "_e__o _o___ guessedletters: e, t, o, s",
+        },
+        "GAME_MESSAGE": {
+            "TYPE": "GAME_MESSAGE",
+            "DATA": "player1 guessed the letter 'e' and won 5000 dollars!",
+        },
+        "SET_PRIZE": {"TYPE": "SET_PRIZE", "DATA": 5000},
+        "LOAD_ROOMS (50)": rooms,
+    }
+
+    samples = [("GAME_CONNECTED_UPDATE (4)", encode_roster)]
+    for name, data in messages.items():
+        samples.append(
+            (name, lambda codec, data=data: [codec.encode(data)])
+        )
+    return samples
+
+
+# encodes each sample with each codec, and prints how long it took and
+# how large the message was
+def compare_codecs(repeat):
+    print(
+        f"{'message':<28}{'codec':<10}{'us/message':>12}{'bytes':>8}"
+    )
+    for name, encode in get_samples():
+        for codec_name, codec in codecs.items():
+            messages = encode(codec)
+            duration = timeit.timeit(lambda: encode(codec), number=repeat)
+            duration /= repeat * len(messages)
+            size = sum(len(message) for message in messages) / len(messages)
+            print(
+                f"{name:<28}{codec_name:<10}" +
+                f"{duration * 1000000:>12.2f}{size:>8.0f}"
+            )
+
+
+# the compression settings to compare, as (name, compression) pairs.
+# a compression of None sends every frame as it is
+def get_compressions(threshold):
+    return [
+        ("off", None),
+        ("every frame", Compression("on")),
+        (f"over {threshold} bytes", Compression("threshold", threshold)),
+        ("every frame, shared", Compression("on", context_takeover=False)),
+        (
+            f"over {threshold} bytes, shared",
+            Compression("threshold", threshold, context_takeover=False),
+        ),
+    ]
+
+
+# plays the games, keeping every frame sent, then compresses the frames
+# in the order they were sent with each compression setting, and prints
+# how long it took and how many bytes were left
+async def compare_compression(arguments):
+    frames = []
+    simulation = Simulation(
+        players=arguments.players,
+        guesser=guessers[arguments.guesser],
+        seed=arguments.seed,
+        features=arguments.features,
+        record=frames,
+    )
+    await simulation.run(arguments.games, arguments.concurrency)
+    frames = [
+        (socket, Frame(fin=True, opcode=OP_TEXT, data=message.encode()))
+        for socket, message in frames
+    ]
+    total = sum(len(frame.data) for _, frame in frames)
+
+    print(f"frames:             {len(frames)}")
+    print(f"bytes:              {total}")
+    print(
+        f"{'compression':<32}{'us/frame':>10}{'bytes':>12}{'saved':>8}"
+    )
+    for name, compression in get_compressions(arguments.threshold):
+        sent = total
+        duration = 0
+        if compression is not None:
+            # each socket agrees the extension's settings as a client
+            # which doesn't ask for any would
+            factory = compression.get_extensions()[0]
+            extensions = {}
+            for socket, _ in frames:
+                if socket not in extensions:
+                    extensions[socket] = factory.process_request_params(
+                        [], []
+                    )[1]
+
+            sent = 0
+            start = time.perf_counter()
+            for socket, frame in frames:
+                sent += len(extensions[socket].encode(frame).data)
+            duration = time.perf_counter() - start
+
+        print(
+            f"{name:<32}{duration / len(frames) * 1000000:>10.2f}" +
+            f"{sent:>12}{1 - sent / total:>8.1%}"
+        )
+
+
+# plays the games and prints the results
+async def benchmark(arguments):
+    simulation = Simulation(
+        players=arguments.players,
+        guesser=guessers[arguments.guesser],
+        seed=arguments.seed,
+        features=arguments.features,
+    )
+
+    if arguments.memory:
+        tracemalloc.start()
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    blocks = sys.getallocatedblocks()
+
+    elapsed = await simulation.run(arguments.games, arguments.concurrency)
+
+    collections = gc.get_stats()[0]["collections"] - collections
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+    rounds = max(simulation.rounds, 1)
+
+    print(f"games:              {simulation.games_finished}")
+    print(f"rounds:             {simulation.rounds}")
+    print(f"guesses:            {simulation.guesses}")
+    print(f"frames sent:        {simulation.frames}")
+    print(f"bytes sent:         {simulation.bytes}")
+    print(f"simulated time:     {simulation.scheduler.now:.0f}s")
+    print(f"real time:          {elapsed:.3f}s")
+    print(f"games/sec:          {simulation.games_finished / elapsed:.1f}")
+    print(f"rounds/sec:         {simulation.rounds / elapsed:.1f}")
+    print(f"guesses/sec:        {simulation.guesses / elapsed:.1f}")
+    # cpython doesn't count every allocation, so the number of young
+    # generation garbage collections (one per 700 or so objects that
+    # are still alive) and the memory left over are used instead
+    print(f"gc runs/round:      {collections / rounds:.2f}")
+    print(f"blocks kept/round:  {blocks / rounds:.1f}")
+    if arguments.memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"peak memory:        {peak / 1024:.0f}KiB")
+        print(f"memory/round:       {current / rounds:.0f}B")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="plays simulated games and measures the game logic"
+    )
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument(
+        "--guesser", choices=list(guessers), default="random"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--memory", action="store_true",
+        help="trace memory use, which makes the games much slower"
+    )
+    parser.add_argument(
+        "--features", nargs="*", default=[],
+        help="the optional protocol features every client uses, such as " +
+        "COMPACT or BATCH"
+    )
+    parser.add_argument(
+        "--codecs", action="store_true",
+        help="compare the codecs on common messages instead of playing games"
+    )
+    parser.add_argument("--repeat", type=int, default=10000)
+    parser.add_argument(
+        "--compression", action="store_true",
+        help="compare the compression settings on the frames sent while " +
+        "playing the games"
+    )
+    parser.add_argument(
+        "--threshold", type=int, default=compress_threshold
+    )
+    arguments = parser.parse_args()
+
+    if arguments.codecs:
+        compare_codecs(arguments.repeat)
+        return
+    if arguments.compression:
+        asyncio.run(compare_compression(arguments))
+        return
+    asyncio.run(benchmark(arguments))
+
+
+# only runs if the file has not been imported
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+BACKENDS CLASS FILE
+this file can be imported by the rooms class and the server network
+it stores the shared state of the rooms: which rooms exist, and how many
+players are in each. The rooms class uses whichever backend
+it is given, so the state can live in this process or be shared between
+several processes
+"""
+
+import uuid
+
+
+class Backend:
+    """
+    the parent backend class. Backends store the list of rooms and the
+    number of players in each, and tell subscribers whenever the list of
+    rooms changes. Who is in a room is only known by the worker the room
+    lives on
+    """
+    def __init__(self):
+        self.subscribers = []
+
+    # adds a coroutine function which is run whenever the room list changes
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    # runs every subscriber after the room list has changed
+    async def publish(self):
+        for callback in self.subscribers:
+            await callback()
+
+    # returns a new unique id for a room. Unlike a hash, the id doesn't
+    # depend on where the room is stored in memory
+    def new_room_id(self):
+        return uuid.uuid4().hex[:12]
+
+    # starts tracking a new room
+    async def add_room(self, id, name):
+        raise NotImplementedError
+
+    # stops tracking a room
+    async def remove_room(self, id):
+        raise NotImplementedError
+
+    # stores the number of players in a room
+    async def set_players(self, id, players):
+        raise NotImplementedError
+
+    # returns a list of every room, in the format sent to clients
+    def get_room_list(self):
+        raise NotImplementedError
+
+    # returns the worker a room lives on, or None if it lives in this
+    # process
+    def get_room_worker(self, id):
+        return None
+
+
+class LocalBackend(Backend):
+    """
+    stores the state of the rooms in this process. This is used when the
+    server is running as a single process
+    """
+    def __init__(self):
+        super().__init__()
+        self.rooms = {}
+
+    async def add_room(self, id, name):
+        self.rooms[id] = {"NAME": name, "HASH": id, "PLAYERS": 0}
+        await self.publish()
+
+    async def remove_room(self, id):
+        if id not in self.rooms:
+            return
+
+        self.rooms.pop(id)
+        await self.publish()
+
+    async def set_players(self, id, players):
+        if id not in self.rooms or self.rooms[id]["PLAYERS"] == players:
+            return
+
+        self.rooms[id]["PLAYERS"] = players
+        await self.publish()
+
+    def get_room_list(self):
+        return list(self.rooms.values())
+
+
+class SharedBackend(Backend):
+    """
+    stores the state of the rooms in the coordinator, so it is shared by
+    every worker process on the machine. Changes are sent to the
+    coordinator through the worker's connection, and the coordinator sends
+    the new state back to every worker
+    """
+    def __init__(self, worker):
+        super().__init__()
+        self.worker = worker
+        self.room_list = []
+        self.room_workers = {}
+        # the number of players last sent for each of this worker's rooms,
+        # so the coordinator is only told when it changes, and not when
+        # someone's ready status does
+        self.players = {}
+
+    async def add_room(self, id, name):
+        self.players[id] = 0
+        self.worker.send({"OP": "ADD_ROOM", "HASH": id, "NAME": name})
+
+    async def remove_room(self, id):
+        self.players.pop(id, None)
+        self.worker.send({"OP": "REMOVE_ROOM", "HASH": id})
+
+    async def set_players(self, id, players):
+        if id not in self.players or self.players[id] == players:
+            return
+
+        self.players[id] = players
+        self.worker.send({"OP": "PLAYERS", "HASH": id, "PLAYERS": players})
+
+    def get_room_list(self):
+        return self.room_list
+
+    def get_room_worker(self, id):
+        return self.room_workers.get(id)
+
+    # stores the state of the rooms sent by the coordinator. Subscribers
+    # are only told if the room list itself has changed
+    async def receive(self, rooms):
+        room_list = [
+            {
+                "NAME": room["NAME"],
+                "HASH": room["HASH"],
+                "PLAYERS": room["PLAYERS"],
+            }
+            for room in rooms
+        ]
+        self.room_workers = {room["HASH"]: room["WORKER"] for room in rooms}
+
+        if room_list != self.room_list:
+            self.room_list = room_list
+            await self.publish()
@@ -0,0 +1,79 @@
+"""
+BROADCAST CLASS FILE
+this file can be imported by the server network and game classes
+it handles sending the same message to many clients at once
+"""
+
+import time
+from classes.Metrics import Histogram
+
+# broadcasts slower than this (in seconds) are printed to the console
+slow_broadcast = 0.5
+
+
+class Broadcast:
+    """
+    the broadcast class encodes a message once for each codec its
+    recipients use, and then hands the encoded message to every
+    recipient's send queue. Each client's own writer task sends it, so a
+    stalled socket only holds up itself.
+    it also keeps track of how long each broadcast takes to be queued for
+    all of its recipients. How long messages then wait to be written is
+    measured by each client as it writes them
+    """
+    def __init__(self):
+        self.times = Histogram()
+
+    # encodes the data once per codec and sends it to every client given
+    async def send(self, clients, data):
+        encoded = {}
+        messages = []
+        for client in clients:
+            message = encoded.get(client.codec)
+            if message is None:
+                message = encoded[client.codec] = client.codec.encode(data)
+            messages.append((client, message))
+        self.fan_out(messages, data.get("TYPE"))
+
+    # sends a payload, which is already encoded for each codec, to every
+    # client given
+    async def send_payload(self, clients, payload):
+        self.fan_out(
+            [(client, payload.encode(client.codec)) for client in clients],
+            payload.type
+        )
+
+    # sends a different message of the same type to each client.
+    # messages is a list of (client, data) pairs
+    async def send_each(self, messages):
+        if len(messages) == 0:
+            return
+
+        self.fan_out(
+            [
+                (client, client.codec.encode(data))
+                for client, data in messages
+            ],
+            messages[0][1].get("TYPE")
+        )
+
+    # queues already encoded messages for their clients and records how
+    # long it took to queue them all
+    def fan_out(self, messages, type):
+        if len(messages) == 0:
+            return
+
+        start = time.perf_counter()
+        for client, message in messages:
+            client.enqueue(message, type)
+        self.record(time.perf_counter() - start, len(messages))
+
+    # stores how long a broadcast took to queue
+    def record(self, duration, recipients):
+        self.times.observe(duration)
+
+        if duration > slow_broadcast:
+            print(
+                f"slow broadcast: {recipients} recipients in " +
+                f"{duration * 1000:.1f}ms"
+            )
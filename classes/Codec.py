@@ -0,0 +1,204 @@
+"""
+CODEC CLASS FILE
+this file can be imported by the server network, broadcast, roster,
+rooms, game and workers classes
+it turns messages into the text sent over the websocket, and back again.
+clients use plain json unless they ask for the compact codec when
+logging in. Messages which are sent many times without changing are
+kept as payloads, so they are only encoded once for each codec
+"""
+
+import json
+
+# every message type, in the order of their numeric codes for the compact
+# codec. New types must only ever be added to the end
+message_types = (
+    # the list of types itself, which is sent to compact clients first
+    "CODEC",
+    # sent by the server
+    "CONNECTED", "ERROR", "REJECTED", "SESSION", "RESUMED", "RESUME_FAILED",
+    "LOAD_ROOMS", "ROOMS_DELTA", "JOINED_ROOM",
+    "ROOM_CONNECTED_UPDATE", "ROOM_ROSTER", "ROOM_ROSTER_DELTA",
+    "JOINED_GAME",
+    "GAME_CONNECTED_UPDATE", "GAME_ROSTER", "GAME_ROSTER_DELTA",
+    "GAME_MESSAGE", "UPDATE_PHRASE", "SET_PRIZE",
+    # sent by clients
+    "LOGIN", "RESUME", "CREATE_ROOM", "JOIN_ROOM", "LEAVE_ROOM",
+    "CHANGE_READY", "SUBMIT_GUESS", "LEAVE_GAME", "SYNC_ROSTER", "SYNC_ROOMS",
+)
+message_codes = {type: code for code, type in enumerate(message_types)}
+
+
+class JsonCodec:
+    """
+    the original encoding. Each message is a json object with a TYPE, its
+    DATA, and sometimes other keys such as VERSION
+    """
+    compact = False
+
+    def encode(self, data):
+        return json.dumps(data)
+
+    # returns the type and data of a message
+    def decode(self, frame):
+        message = json.loads(frame)
+        return message["TYPE"], message.get("DATA")
+
+
+class CompactCodec:
+    """
+    each message is a json array, starting with the numeric code of its
+    type, followed by its data and any other keys in order. Lists of
+    rooms and players are sent as arrays of values, rather than objects
+    with a key for every value, and no spaces are added
+    """
+    compact = True
+
+    def __init__(self):
+        # the types whose data is laid out differently, and the function
+        # which returns the values for each
+        self.packers = {
+            "LOAD_ROOMS": self.pack_rooms,
+            "ROOMS_DELTA": self.pack_rooms_delta,
+            "JOINED_ROOM": self.pack_room,
+            "UPDATE_PHRASE": self.pack_phrase,
+            "ROOM_CONNECTED_UPDATE": self.pack_legacy_roster,
+            "GAME_CONNECTED_UPDATE": self.pack_legacy_roster,
+            "ROOM_ROSTER": self.pack_roster,
+            "GAME_ROSTER": self.pack_roster,
+        }
+
+    def encode(self, data):
+        type = data["TYPE"]
+        packer = self.packers.get(type)
+        if packer is not None:
+            values = packer(data)
+        else:
+            values = [
+                value for key, value in data.items() if key != "TYPE"
+            ]
+        return self.dumps([message_codes.get(type, type)] + values)
+
+    # encodes values as json without any spaces
+    def dumps(self, values):
+        return json.dumps(values, separators=(",", ":"))
+
+    # returns the type and data of a message. Messages in the original
+    # encoding are accepted as well
+    def decode(self, frame):
+        message = json.loads(frame)
+        if not isinstance(message, list):
+            return message["TYPE"], message.get("DATA")
+
+        type = message[0]
+        if isinstance(type, int) and 0 <= type < len(message_types):
+            type = message_types[type]
+        data = message[1] if len(message) > 1 else None
+        return type, data
+
+    # [[id, name, players], ...], version
+    def pack_rooms(self, data):
+        return [
+            [self.pack_room_entry(room) for room in data["DATA"]],
+            data["VERSION"],
+        ]
+
+    # version, added rooms, removed ids, updated rooms
+    def pack_rooms_delta(self, data):
+        delta = data["DATA"]
+        return [
+            delta["VERSION"],
+            [self.pack_room_entry(room) for room in delta["ADDED"]],
+            delta["REMOVED"],
+            [self.pack_room_entry(room) for room in delta["UPDATED"]],
+        ]
+
+    def pack_room_entry(self, room):
+        return [room["HASH"], room["NAME"], room["PLAYERS"]]
+
+    # id, name
+    def pack_room(self, data):
+        return [data["DATA"]["HASH"], data["DATA"]["NAME"]]
+
+    # the phrase with underscores, and the guessed letters in order
+    def pack_phrase(self, data):
+        phrase, _, guessed = data["DATA"].rpartition(" guessedletters: ")
+        return [phrase, guessed.replace(", ", "")]
+
+    # [[name, score or ready, is turn], ...], the recipient's position.
+    # the roster class builds these itself for many recipients at once
+    def pack_legacy_roster(self, data):
+        rows = []
+        you = None
+        for index, entry in enumerate(data["DATA"].values()):
+            if entry["YOU"]:
+                you = index
+            rows.append(
+                [value for key, value in entry.items() if key != "YOU"]
+            )
+        return [rows, you]
+
+    # encodes the start of a roster in the original format, for many
+    # recipients at once. Each recipient's message is this, followed by
+    # their position and a closing bracket
+    def encode_legacy_roster(self, type, rows):
+        return f"[{message_codes[type]},{self.dumps(rows)},"
+
+    # version, the recipient's id, the id whose turn it is, and
+    # [[id, name, score or ready], ...]
+    def pack_roster(self, data):
+        roster = data["DATA"]
+        return [
+            roster["VERSION"],
+            roster["YOU"],
+            roster["TURN"],
+            [
+                [int(id)] + list(entry.values())
+                for id, entry in roster["PLAYERS"].items()
+            ],
+        ]
+
+
+class Payload:
+    """
+    a message which is sent many times without changing, such as the
+    room list. It is encoded the first time it is sent with each codec,
+    and the encoded copy is reused after that. A message which changes
+    is replaced with a new payload
+    """
+    def __init__(self, data):
+        self.data = data
+        self.type = data["TYPE"]
+        self.encoded = {}
+
+    # returns the message encoded with a codec
+    def encode(self, codec):
+        message = self.encoded.get(codec)
+        if message is None:
+            message = self.encoded[codec] = codec.encode(self.data)
+        return message
+
+
+json_codec = JsonCodec()
+compact_codec = CompactCodec()
+codecs = (json_codec, compact_codec)
+
+
+# returns a payload for a message which never changes, encoded with
+# every codec straight away
+def static_payload(data):
+    payload = Payload(data)
+    for codec in codecs:
+        payload.encode(codec)
+    return payload
+
+
+# the table of type codes, sent to compact clients when they log in
+codec_table = static_payload({"TYPE": "CODEC", "DATA": list(message_types)})
+
+
+# returns the codec for a client, from the features it asked for
+def get_codec(features):
+    if "COMPACT" in features:
+        return compact_codec
+    return json_codec
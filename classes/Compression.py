@@ -0,0 +1,161 @@
+"""
+COMPRESSION CLASS FILE
+this file can be imported by the server network and the benchmark
+it sets up how messages are compressed (the permessage-deflate websocket
+extension). Small messages cost more cpu to compress than they save, so
+by default only messages over a size threshold are compressed. Without
+context takeover, a message broadcast to many clients is only
+compressed once
+"""
+
+import collections
+import os
+from websockets.extensions.permessage_deflate import (
+    PerMessageDeflate,
+    ServerPerMessageDeflateFactory,
+)
+from websockets.frames import CTRL_OPCODES, OP_CONT, Frame
+
+# "off" never compresses messages, "on" compresses every message, and
+# "threshold" only compresses messages of at least compress_threshold
+# bytes
+compression = os.environ.get("COMPRESSION", "threshold")
+compress_threshold = int(os.environ.get("COMPRESS_THRESHOLD", 64))
+# the size of the window the server compresses with (8 to 15), and how
+# much memory zlib uses while compressing (1 to 9). Larger values
+# compress slightly better, but use more memory for every connection.
+# a window of 12 and memory level of 5 use about 32KiB, rather than the
+# 256KiB zlib uses by default
+window_bits = int(os.environ.get("COMPRESS_WINDOW_BITS", 12))
+memory_level = int(os.environ.get("COMPRESS_MEMORY_LEVEL", 5))
+# how hard zlib tries to compress (1 to 9)
+compress_level = int(os.environ.get("COMPRESS_LEVEL", 6))
+# whether each connection keeps its compression state between messages.
+# game messages repeat a lot, so this compresses them far better, but
+# the same message is then compressed differently for each client. With
+# it turned off ("0"), a message broadcast to many clients is only
+# compressed once
+context_takeover = os.environ.get("COMPRESS_CONTEXT_TAKEOVER", "1") == "1"
+# how many recently compressed messages are kept to be reused
+shared_frames = 64
+
+
+class SharedDeflate(PerMessageDeflate):
+    """
+    the permessage-deflate extension for a single connection. Messages
+    under the threshold are sent uncompressed, which the extension allows
+    for any message. Without context takeover, the same message always
+    compresses to the same bytes, so recent messages are looked up in the
+    compression's cache before being compressed again
+    """
+    def __init__(self, compression, *args):
+        super().__init__(*args)
+        self.compression = compression
+
+    def encode(self, frame):
+        if frame.opcode in CTRL_OPCODES or frame.opcode == OP_CONT:
+            # continuation frames only follow a first frame over the
+            # threshold, as small messages are sent in a single frame
+            return super().encode(frame)
+
+        stats = self.compression
+        size = len(frame.data)
+        if frame.fin and size < stats.threshold:
+            stats.skipped += 1
+            return frame
+
+        if not frame.fin or not self.local_no_context_takeover:
+            encoded = super().encode(frame)
+            stats.record(size, len(encoded.data))
+            return encoded
+
+        key = (self.local_max_window_bits, frame.data)
+        data = stats.cache.get(key)
+        if data is None:
+            data = super().encode(frame).data
+            stats.remember(key, data)
+            stats.record(size, len(data))
+        else:
+            stats.cache.move_to_end(key)
+            stats.shared += 1
+        return Frame(
+            fin=frame.fin, opcode=frame.opcode, data=data, rsv1=True,
+            rsv2=frame.rsv2, rsv3=frame.rsv3
+        )
+
+
+class SharedDeflateFactory(ServerPerMessageDeflateFactory):
+    """
+    agrees the extension's settings with each client, the same way as
+    websockets' own factory, and makes a shared deflate extension
+    """
+    def __init__(self, compression, **settings):
+        super().__init__(**settings)
+        self.compression = compression
+
+    def process_request_params(self, params, accepted_extensions):
+        response, extension = super().process_request_params(
+            params, accepted_extensions
+        )
+        return response, SharedDeflate(
+            self.compression,
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+        )
+
+
+class Compression:
+    """
+    the compression class stores the compression settings, the messages
+    which were compressed recently, and counts what was compressed
+    """
+    def __init__(
+        self, mode=compression, threshold=compress_threshold,
+        window_bits=window_bits, memory_level=memory_level,
+        level=compress_level, context_takeover=context_takeover
+    ):
+        if mode not in ("off", "on", "threshold"):
+            raise ValueError(f"unknown compression mode: {mode}")
+
+        self.mode = mode
+        self.threshold = threshold if mode == "threshold" else 0
+        self.window_bits = window_bits
+        self.settings = {"memLevel": memory_level, "level": level}
+        self.context_takeover = context_takeover
+        self.cache = collections.OrderedDict()
+
+        # the messages compressed, sent uncompressed, and reused, and the
+        # size of the compressed messages before and after
+        self.compressed = 0
+        self.skipped = 0
+        self.shared = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    # returns the extensions to pass to the websocket server
+    def get_extensions(self):
+        if self.mode == "off":
+            return []
+        return [
+            SharedDeflateFactory(
+                self,
+                server_no_context_takeover=not self.context_takeover,
+                server_max_window_bits=self.window_bits,
+                compress_settings=self.settings,
+            )
+        ]
+
+    # stores a compressed message, so other clients can be sent it
+    def remember(self, key, data):
+        self.cache[key] = data
+        if len(self.cache) > shared_frames:
+            self.cache.popitem(last=False)
+
+    # counts a message which was compressed
+    def record(self, size, compressed_size):
+        self.compressed += 1
+        self.bytes_in += size
+        self.bytes_out += compressed_size
@@ -0,0 +1,149 @@
+"""
+DISPATCHER CLASS FILE
+this file can be imported by the server network
+it passes each message from a client to the handler for its type, after
+checking the message's data is in the form the handler expects
+"""
+
+
+class Field:
+    """
+    describes the data a message type expects, such as a string of up to
+    20 characters. The checks are worked out once, when the field is
+    made, so checking a message only runs the checks that are needed.
+    a field for a dictionary describes each of its keys with another field
+    """
+    def __init__(
+        self, kinds, required=True, min_length=None, max_length=None,
+        fields=None, messages=None
+    ):
+        # the types the data can be, such as str or (int, float)
+        self.kinds = kinds if isinstance(kinds, tuple) else (kinds,)
+        self.required = required
+        self.min_length, self.max_length = min_length, max_length
+        self.fields = fields
+        # the error shown to the player for each problem, if the default
+        # isn't clear enough
+        self.messages = messages or {}
+
+        self.checks = [self.check_kind]
+        if min_length is not None or max_length is not None:
+            self.checks.append(self.check_length)
+        if fields is not None:
+            self.checks.append(self.check_fields)
+
+    # returns None if the data is valid, or the problem with it as a
+    # (code, message) pair
+    def check(self, data):
+        if data is None:
+            if self.required:
+                return self.problem("MISSING", "Data is missing")
+            return None
+
+        for check in self.checks:
+            problem = check(data)
+            if problem is not None:
+                return problem
+        return None
+
+    # returns the code and message for a problem
+    def problem(self, code, message):
+        return code, self.messages.get(code, message)
+
+    def check_kind(self, data):
+        # booleans are a kind of int in python, but aren't numbers here
+        if isinstance(data, bool) and bool not in self.kinds:
+            return self.problem("WRONG_KIND", "Data is the wrong kind")
+        if not isinstance(data, self.kinds):
+            return self.problem("WRONG_KIND", "Data is the wrong kind")
+        return None
+
+    def check_length(self, data):
+        if self.min_length is not None and len(data) < self.min_length:
+            return self.problem("TOO_SHORT", "Data is too short")
+        if self.max_length is not None and len(data) > self.max_length:
+            return self.problem("TOO_LONG", "Data is too long")
+        return None
+
+    def check_fields(self, data):
+        for name, field in self.fields.items():
+            problem = field.check(data.get(name))
+            if problem is not None:
+                return problem
+        return None
+
+
+class Choice:
+    """
+    describes data which can be in one of several forms, such as a room's
+    name on its own, or an object with the name and other settings. The
+    data is checked with the first field whose kind it is
+    """
+    def __init__(self, *fields):
+        self.fields = fields
+
+    # returns None if the data is valid, or the problem with it as a
+    # (code, message) pair
+    def check(self, data):
+        for field in self.fields:
+            if field.check_kind(data) is None:
+                return field.check(data)
+        return self.fields[0].check(data)
+
+
+class Dispatcher:
+    """
+    the dispatcher stores the handler and field for each message type.
+    messages with an unknown type, or with data that doesn't match the
+    field, are turned away with a reply saying why, and the client stays
+    connected
+    """
+    def __init__(self):
+        self.handlers = {}
+        # the number of messages turned away, by the code sent back
+        self.rejected = {}
+
+    # adds the coroutine function which deals with a type of message. It
+    # is run with the client and the message's data
+    def register(self, type, handler, field=None):
+        self.handlers[type] = (handler, field)
+
+    # checks a message, and returns the handler it should be passed to,
+    # or None if it was turned away
+    async def get_handler(self, client, type, data):
+        entry = None
+        if isinstance(type, str):
+            entry = self.handlers.get(type)
+        if entry is None:
+            await self.reject(
+                client, type, "UNKNOWN_TYPE", "Unknown message type"
+            )
+            return None
+
+        handler, field = entry
+        if field is not None:
+            problem = field.check(data)
+            if problem is not None:
+                code, message = problem
+                self.count_rejected(code)
+                await client.error(message, code, type)
+                return None
+
+        return handler
+
+    # counts a message which was turned away, by the code sent back
+    def count_rejected(self, code):
+        self.rejected[code] = self.rejected.get(code, 0) + 1
+
+    # tells the client a message was turned away. Unlike an error, this
+    # doesn't show a popup on older clients, which ignore the type
+    async def reject(self, client, type, code, message):
+        self.count_rejected(code)
+        if not isinstance(type, str):
+            type = None
+        await client.send(
+            {
+                "TYPE": "REJECTED",
+                "DATA": {"CODE": code, "FOR": type, "MESSAGE": message},
+            }
+        )
@@ -5,13 +5,19 @@ main server loop
 """
 
 import random
-import re
-import asyncio
+from classes.Phrases import get_phrases, alphabet
+from classes.Roster import Roster
+from classes.Codec import static_payload
 
-# stores a reference to the file containing the game's phrases
-phrases_file = "src/phrases"
-# used to check if a guess is in the alphabet
-alphabet = "abcdefghijklmnopqrstuvwxyz"
+# how long (in seconds) the final results are shown before players are
+# sent back to the room list
+results_time = 10
+# how long (in seconds) a player has to guess once the wheel has stopped.
+# If they don't, their turn is skipped, so a player who has left their tab
+# open can't hold up the rest of the game
+turn_timeout = 30
+# sent to every player when a game starts
+joined_game = static_payload({"TYPE": "JOINED_GAME", "DATA": ""})
 
 
 class Game:
@@ -67,22 +73,26 @@ class Game:
             player.client.player = None
             player.client.location = "ROOM_LIST"
 
+            # everybody has left, so the game is no longer needed
+            if len(self.players) == 0:
+                self.game.end()
+                return
+
+            # once the game has finished there are no more turns
+            if self.game.finished:
+                return
+
             # shifts to the next person's turn if needed
             current_round = self.game.round_handler.current_round
-            if len(self.players) == 0:
-                if hasattr(self, 'game'):
-                    del self.game
+            if player == current_round.current_player:
+                current_round.current_player_index -= 1
+                await current_round.advance()
             else:
-                if player == current_round.current_player:
-                    current_round.current_player_index -= 1
-                    await current_round.advance()
-                else:
-                    current_round.current_player_index = self.players.index(
-                        current_round.current_player
-                    )
-            
-            if hasattr(self, 'game'):
-                await self.game.update_players()
+                current_round.current_player_index = self.players.index(
+                    current_round.current_player
+                )
+
+            await self.game.update_players()
 
     class PhraseHandler(Service):
         """
@@ -96,10 +106,12 @@ class Game:
             text. These may be selected during a game to be guessed by
             the players
             """
-            def __init__(self):
-                self.text = random.choice(
-                    open(phrases_file).readlines()
-                ).rstrip()
+            def __init__(self, phrases, index):
+                self.index = index
+                self.text = phrases.texts[index]
+                self.lowered = phrases.lowered[index]
+                self.letters = phrases.letters[index]
+                self.reveal_count = phrases.reveal_counts[index]
 
                 """
                 this section of code is unused. It was originally
@@ -137,8 +149,18 @@ class Game:
                 self.lines = lines
                 """
 
-        def __init__(self, game):
+        def __init__(self, game, phrase_filter):
             super().__init__(game)
+            self.phrases = get_phrases()
+            # phrase_filter can limit the phrases to a range of lengths
+            # and/or numbers of different letters
+            self.bag = self.phrases.get_bag(**phrase_filter)
+
+        # picks a random phrase for a round, which hasn't already been
+        # used in this game. The phrases are already loaded, so this
+        # doesn't need to read the phrases file
+        def get_phrase(self):
+            return self.Phrase(self.phrases, self.bag.draw())
 
     class RoundHandler(Service):
         """
@@ -156,7 +178,14 @@ class Game:
             """
             def __init__(self, game):
                 self.game = game
-                self.phrase = game.phrase_handler.Phrase()
+                self.phrase = game.phrase_handler.get_phrase()
+
+                # the positions of each letter in the phrase, so a guess
+                # only has to look at the places the letter appears
+                self.positions = {}
+                for position, letter in enumerate(self.phrase.lowered):
+                    if letter in alphabet:
+                        self.positions.setdefault(letter, []).append(position)
                 self.current_player = random.choice(
                     game.player_handler.players
                 )
@@ -170,9 +199,27 @@ class Game:
                 self.prize = self.game.wheel_handler.generate_prize()
 
                 self.guessed_letters = set([",", "-", "'", '"', " "])
-                self.ignore_letters = set([",", "-", "'", '"', " "])
                 self.total_guessed = 0
 
+                # the phrase as it is shown to players. Letters are hidden
+                # with underscores, and are revealed as they are guessed.
+                # the guessed letters are kept in the order they were
+                # guessed in
+                self.mask = [
+                    "_" if letter in alphabet else letter
+                    for letter in self.phrase.lowered
+                ]
+                self.guessed_order = []
+                self.display_phrase = None
+
+                # guesses are not accepted while waiting is true, such as
+                # while the wheel is spinning. finished is set once the
+                # phrase has been solved
+                self.waiting = False
+                self.finished = False
+                self.transition = None
+                self.turn_timer = None
+
                 await self.game.update_players()
                 await self.update_phrase()
 
@@ -180,7 +227,11 @@ class Game:
                     {"TYPE": "GAME_MESSAGE", "DATA": "A new round is starting"}
                 )
 
-                await asyncio.sleep(1.5)
+                self.wait(1.5, self.first_turn)
+
+            # this starts the first turn of the round, once the players have
+            # been told that a new round is starting
+            async def first_turn(self):
                 await self.send_turn_data()
                 await self.update_phrase()
 
@@ -188,7 +239,48 @@ class Game:
                     {"TYPE": "SET_PRIZE", "DATA": self.prize}
                 )
 
-                await asyncio.sleep(5)
+                self.wait(5)
+
+            # stops guesses from being accepted for delay seconds, then
+            # runs the callback (if one is given). The timer is owned by the
+            # game, rather than the client whose message caused it, so the
+            # client's messages can still be handled in the meantime
+            def wait(self, delay, callback=None, *args):
+                if self.transition is not None:
+                    self.transition.cancel()
+                if self.turn_timer is not None:
+                    self.turn_timer.cancel()
+                    self.turn_timer = None
+
+                self.waiting = True
+                self.transition = self.game.timer_handler.schedule(
+                    delay, self.stop_waiting, callback, args
+                )
+
+            # allows guesses again, and runs the callback given to wait.
+            # If guesses are still allowed afterwards, the current player
+            # has turn_timeout seconds to make one
+            async def stop_waiting(self, callback, args):
+                self.waiting = False
+                self.transition = None
+                if callback is not None:
+                    await callback(*args)
+
+                if not self.waiting and not self.finished:
+                    self.turn_timer = self.game.timer_handler.schedule(
+                        turn_timeout, self.skip_turn
+                    )
+
+            # moves onto the next player when the current player hasn't
+            # guessed in time
+            async def skip_turn(self):
+                self.turn_timer = None
+                name = self.current_player.client.name
+                await self.game.send_all(
+                    {"TYPE": "GAME_MESSAGE", "DATA": f"{name} ran out of time"}
+                )
+
+                self.wait(1, self.advance, False)
 
             # moves onto the next persons turn. Maintains the correct
             # order even when people leave the game
@@ -202,6 +294,11 @@ class Game:
 
                 await self.game.update_players()
 
+                # the round is already over, and the next round is about to
+                # start, so there is no need to spin the wheel again
+                if self.finished:
+                    return
+
                 await self.send_turn_data()
                 await self.update_phrase()
 
@@ -210,50 +307,61 @@ class Game:
                     {"TYPE": "SET_PRIZE", "DATA": self.prize}
                 )
 
-                await asyncio.sleep(5)
+                self.wait(5)
+
+            # spins the wheel again for the current player after they have
+            # guessed a letter correctly
+            async def respin(self):
+                self.prize = self.game.wheel_handler.generate_prize()
+                await self.game.send_all(
+                    {"TYPE": "SET_PRIZE", "DATA": self.prize}
+                )
+
+            # finishes the round, and starts the next one after a delay
+            def finish(self, delay):
+                self.finished = True
+                self.wait(delay, self.game.round_handler.new_round)
 
             # this sends a message to the client telling the player
             # who's turn it is
             async def send_turn_data(self):
+                messages = []
                 for player in self.game.player_handler.players:
                     name = self.current_player.client.name
                     is_turn = player == self.current_player
                     msg_data = "Your" if is_turn else f"{name}'s"
                     msg = f"It is {msg_data} turn"
                     data = {"TYPE": "GAME_MESSAGE", "DATA": msg}
-                    await player.client.send(data)
+                    messages.append((player.client, data))
+
+                await self.game.network.broadcast.send_each(messages)
 
             # this updates the phrase representation (with underscores)
             # and sends it to all the players. Also adds the guessed
-            # letters
+            # letters. The representation is only rebuilt after a guess
             async def update_phrase(self):
-                self.display_phrase = (
-                    "".join(
-                        [
-                            letter if letter.lower()
-                            in self.guessed_letters else "_"
-                            for letter in self.phrase.text
-                        ]
-                    ) +
-                    " guessedletters: " +
-                    ", ".join(
-                        list(
-                            filter(
-                                (None).__ne__,
-                                [
-                                    letter
-                                    if letter not in self.ignore_letters
-                                    else None
-                                    for letter in self.guessed_letters
-                                ],
-                            )
-                        )
+                if self.display_phrase is None:
+                    self.display_phrase = (
+                        "".join(self.mask) +
+                        " guessedletters: " +
+                        ", ".join(self.guessed_order)
                     )
-                )
                 await self.game.send_all(
                     {"TYPE": "UPDATE_PHRASE", "DATA": self.display_phrase}
                 )
 
+            # reveals every position of a letter in the phrase, and
+            # returns how many times the letter appears
+            def reveal(self, letter):
+                self.guessed_letters.add(letter)
+                self.guessed_order.append(letter)
+                self.display_phrase = None
+
+                positions = self.positions.get(letter, ())
+                for position in positions:
+                    self.mask[position] = self.phrase.text[position]
+                return len(positions)
+
             # this is fired when the server class recieves a guess
             # attempt from a client. It handles checking the
             # validity of the guess, awarding points, etc.
@@ -264,8 +372,25 @@ class Game:
                     )
                     return
 
+                # guesses made between turns or rounds are turned away
+                # without an error popup, as the player has done nothing
+                # wrong. They can guess again once the next turn starts
+                if self.finished:
+                    await self.game.network.dispatcher.reject(
+                        player.client, "SUBMIT_GUESS", "ROUND_FINISHED",
+                        "This round has finished"
+                    )
+                    return
+
+                if self.waiting:
+                    await self.game.network.dispatcher.reject(
+                        player.client, "SUBMIT_GUESS", "WAITING",
+                        "Please wait for the wheel to stop spinning"
+                    )
+                    return
+
                 guess = guess.lower()
-                phrase = self.phrase.text.lower()
+                phrase = self.phrase.lowered
 
                 if guess in self.guessed_letters:
                     await player.client.error("Please submit a new letter")
@@ -275,9 +400,7 @@ class Game:
                     # client guessed a single letter
                     if guess in alphabet:
                         if guess not in self.guessed_letters:
-                            occurances = phrase.count(guess)
-
-                            self.guessed_letters.add(guess)
+                            occurances = self.reveal(guess)
                             self.total_guessed += occurances
 
                             if occurances == 0:
@@ -292,9 +415,7 @@ class Game:
                                     }
                                 )
 
-                                await asyncio.sleep(1)
-
-                                await self.advance(False)
+                                self.wait(1, self.advance, False)
                             else:
                                 # client guessed correctly
                                 score = self.prize * occurances
@@ -312,25 +433,11 @@ class Game:
                                     }
                                 )
 
-                                if self.total_guessed >= len(
-                                    re.sub(r"\W+", "", phrase)
-                                ):
-
-                                    await asyncio.sleep(3)
-                                    await self.game.round_handler.new_round()
-                                    return
+                                reveal_count = self.phrase.reveal_count
+                                if self.total_guessed >= reveal_count:
+                                    self.finish(3)
                                 else:
-                                    await asyncio.sleep(2)
-                                    wheel_handler = self.game.wheel_handler
-                                    self.prize = (
-                                        wheel_handler.generate_prize()
-                                    )
-                                    await self.game.send_all(
-                                        {
-                                            "TYPE": "SET_PRIZE",
-                                            "DATA": self.prize
-                                        }
-                                    )
+                                    self.wait(2, self.respin)
                     else:
                         await player.client.error(
                             "Your guess must only be alphabetical characters"
@@ -356,9 +463,7 @@ guessed the phrase '{guess}' and won $1000",
                         )
 
                         await self.update_phrase()
-                        await asyncio.sleep(3)
-
-                        await self.game.round_handler.new_round()
+                        self.finish(3)
                         return
                     else:
                         # client got phrase incorrect
@@ -398,9 +503,13 @@ guessed the phrase '{guess}'",
                         "DATA": f"GAME FINISHED! Winner: {best_player}",
                     }
                 )
-                # this is in order to keep clients connected with very
-                # little overhead
-                await asyncio.sleep(99999)
+                # the results are left on screen for a while, before the
+                # players are sent back to the room list
+                self.game.finished = True
+                self.game.timer_handler.schedule(
+                    results_time, self.game.finish
+                )
+                return None
 
             round = self.Round(self.game)
             self.current_round = round
@@ -408,6 +517,26 @@ guessed the phrase '{guess}'",
 
             return round
 
+    class TimerHandler(Service):
+        """
+        the timer handler service runs the game's delayed events, such as
+        moving onto the next turn or round. It uses the network's shared
+        scheduler, and all of the game's events can be cancelled at once
+        when the game ends
+        """
+        def __init__(self, game):
+            super().__init__(game)
+            self.timers = game.network.scheduler.group()
+
+        # runs the coroutine function with the given arguments after
+        # delay seconds
+        def schedule(self, delay, function, *args):
+            return self.timers.schedule(delay, function, *args)
+
+        # cancels every event which hasn't happened yet
+        def cancel(self):
+            self.timers.cancel()
+
     class WheelHandler(Service):
         """
         this class handles generating a random priE each time the wheel
@@ -422,49 +551,88 @@ guessed the phrase '{guess}'",
             return random.choice(self.prizes)
 
     def __init__(self, room):
-        self.add_services()
+        self.network = room.room_handler.network
+        self.finished = False
+        self.roster = Roster("GAME", "GAME_CONNECTED_UPDATE", turns=True)
+        self.add_services(room.phrase_filter)
 
+        # the room has served its purpose once the game starts, so the
+        # clients no longer keep a reference to it
         for client in room.connected:
             client.game = self
+            client.room = None
+            client.location = "GAME"
             self.player_handler.add_player(client)
 
     # this starts up a new game instance. This is done seperately from
     # the __init__ dunder function, as it needs to be run asynchronously
     async def start(self):
-        data = {"TYPE": "JOINED_GAME", "DATA": ""}
-        await self.send_all(data)
+        self.network.games.add(self)
+
+        await self.network.broadcast.send_payload(
+            self.get_clients(), joined_game
+        )
 
         self.current_round = await self.round_handler.new_round()
 
+    # passes a guess from a player onto the current round
+    async def make_guess(self, player, guess):
+        await self.round_handler.current_round.make_guess(player, guess)
+
+    # this is run once the final results have been shown. It sends every
+    # player back to the room list, and then ends the game
+    async def finish(self):
+        for player in self.player_handler.players:
+            player.client.game = None
+            player.client.player = None
+            player.client.location = "ROOM_LIST"
+        await self.network.broadcast.send_payload(
+            self.get_clients(), self.network.rooms.get_snapshot()
+        )
+
+        self.end()
+
+    # stops the game and untracks it. Every reference to the game is
+    # removed, so that it can be garbage collected
+    def end(self):
+        self.finished = True
+        self.timer_handler.cancel()
+        self.network.games.discard(self)
+
+        self.player_handler.players.clear()
+        self.round_handler.current_round = None
+        self.current_round = None
+
     # this starts up and creates a reference to all of the services
-    def add_services(self):
+    def add_services(self, phrase_filter):
         self.player_handler = self.PlayerHandler(self)
-        self.phrase_handler = self.PhraseHandler(self)
+        self.phrase_handler = self.PhraseHandler(self, phrase_filter)
         self.round_handler = self.RoundHandler(self)
+        self.timer_handler = self.TimerHandler(self)
         self.wheel_handler = self.WheelHandler(self)
 
     # this sends out a websocket to all the players telling them who's
-    # turn it is, who is in the game, and what score everyone has
+    # turn it is, who is in the game, and what score everyone has.
+    # players who support it are only sent what has changed
     async def update_players(self):
         current_player = self.round_handler.current_round.current_player
-        for player in self.player_handler.players:
-            player_info = {}
-            player_id = 0
-            for other in self.player_handler.players:
-                info = {
-                    "NAME": other.client.name,
-                    "YOU": other == player,
-                    "SCORE": other.score,
-                    "IS_TURN": current_player == other,
-                }
-                player_info[player_id] = info
-                player_id += 1
-
-            await player.client.send(
-                {"TYPE": "GAME_CONNECTED_UPDATE", "DATA": player_info}
-            )
+        await self.roster.send(
+            self.network.broadcast,
+            [
+                (
+                    player.client,
+                    {"NAME": player.client.name, "SCORE": player.score}
+                )
+                for player in self.player_handler.players
+            ],
+            current_player.client
+        )
 
     # this function can be used to send a message to every player in the game
+    # the message is only encoded once, and is sent to everyone at once
     async def send_all(self, data):
-        for player in self.player_handler.players:
-            await player.client.send(data)
+        await self.network.broadcast.send(self.get_clients(), data)
+
+    # returns the client of every player in the game
+    def get_clients(self):
+        return [player.client for player in self.player_handler.players]
@@ -0,0 +1,336 @@
+"""
+METRICS CLASS FILE
+this file can be imported by the server network, broadcast and monitor
+classes
+it counts what the server is doing, such as the messages it receives
+and how long they take to deal with, and shows them at /metrics in the
+text format prometheus reads
+"""
+
+import bisect
+
+# the upper limits (in seconds) of the histogram buckets used for timings
+time_buckets = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1,
+)
+# the most different message types which are counted separately. Any
+# other types are counted together, so a client sending made up types
+# can't make the metrics grow forever
+max_message_types = 32
+# the start of the name of every metric
+prefix = "game_server"
+
+
+# returns a label value with the characters prometheus treats specially
+# escaped
+def escape(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+# returns the text for a label set, such as {type="LOGIN"}
+def format_labels(labels):
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(
+        f'{name}="{escape(value)}"' for name, value in labels.items()
+    ) + "}"
+
+
+class Histogram:
+    """
+    counts how many values fell into each bucket, along with their total.
+    adding a value is only a binary search and a few additions, so it is
+    cheap enough to do for every message
+    """
+    def __init__(self, buckets=time_buckets):
+        self.buckets = buckets
+        # the last count is for values larger than every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # returns the lines for the histogram. Prometheus buckets count every
+    # value up to their limit, so the counts are added up as they go
+    def render(self, name, labels):
+        lines = []
+        total = 0
+        for limit, count in zip(self.buckets, self.counts):
+            total += count
+            bucket_labels = dict(labels, le=limit)
+            lines.append(
+                f"{name}_bucket{format_labels(bucket_labels)} {total}"
+            )
+        bucket_labels = dict(labels, le="+Inf")
+        lines.append(
+            f"{name}_bucket{format_labels(bucket_labels)} {self.count}"
+        )
+        lines.append(f"{name}_sum{format_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {self.count}")
+        return lines
+
+
+class Metrics:
+    """
+    the metrics class stores the counters which are updated as the server
+    runs. Everything else (such as how many clients are connected) is
+    read from the network when the metrics are requested
+    """
+    def __init__(self):
+        # the number of messages received of each type, and how long
+        # their handlers took
+        self.messages = {}
+        self.handler_times = {}
+        # every frame received, including those which were turned away
+        # before being dispatched
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        # how long messages waited between being queued for a client and
+        # being written to its socket
+        self.delivery = Histogram()
+        # connections turned away, by the reason why, and connections
+        # closed for not logging in in time
+        self.rejected = {}
+        self.login_timeouts = 0
+
+    # counts a frame received from a client, before it is decoded
+    def record_received(self, size):
+        self.frames_received += 1
+        self.bytes_received += size
+
+    # counts a message which was dispatched, and how long it took to deal
+    # with
+    def record_message(self, type, duration):
+        if not isinstance(type, str):
+            type = "OTHER"
+        if type not in self.messages:
+            if len(self.messages) >= max_message_types:
+                type = "OTHER"
+            if type not in self.messages:
+                self.messages[type] = 0
+                self.handler_times[type] = Histogram()
+
+        self.messages[type] += 1
+        self.handler_times[type].observe(duration)
+
+    # counts a frame written to a client's socket, and how long each of
+    # the messages in it waited to be written
+    def record_sent(self, size, delays):
+        self.frames_sent += 1
+        self.bytes_sent += size
+        for delay in delays:
+            self.delivery.observe(delay)
+
+    # counts a connection which was turned away
+    def record_rejected(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    # returns every metric for the network, in the prometheus text format
+    def render(self, network):
+        labels = {}
+        if network.worker is not None:
+            # each worker process has its own metrics
+            labels["worker"] = network.worker.id
+
+        lines = []
+
+        def add(name, kind, help, values):
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for extra, value in values:
+                lines.append(
+                    f"{prefix}_{name}{format_labels(dict(labels, **extra))} " +
+                    f"{value}"
+                )
+
+        queues = [len(client.queue) for client in network.connected]
+
+        add(
+            "sockets", "gauge", "open websocket connections",
+            [({}, len(network.sockets))]
+        )
+        add(
+            "pending_sockets", "gauge",
+            "open websocket connections which haven't logged in yet",
+            [({}, len(network.pending))]
+        )
+        add(
+            "rejected_connections_total", "counter",
+            "connections turned away, by reason",
+            [
+                ({"reason": reason}, count)
+                for reason, count in self.rejected.items()
+            ]
+        )
+        add(
+            "login_timeouts_total", "counter",
+            "connections closed for not logging in in time",
+            [({}, self.login_timeouts)]
+        )
+        add(
+            "idle_disconnects_total", "counter",
+            "clients disconnected for being idle for too long",
+            [({}, network.reaper.reaped)]
+        )
+        add(
+            "clients", "gauge", "logged in clients, by location",
+            [
+                ({"location": location}, count)
+                for location, count in network.get_location_counts().items()
+            ]
+        )
+        add(
+            "sessions", "gauge", "clients which can resume their session",
+            [({}, len(network.sessions))]
+        )
+        add(
+            "rooms", "gauge", "rooms on this process",
+            [({}, len(network.rooms.rooms))]
+        )
+        add(
+            "games", "gauge", "games being played",
+            [({}, network.get_live_games())]
+        )
+        add(
+            "queued_messages", "gauge",
+            "messages waiting to be sent, across every client",
+            [({}, sum(queues))]
+        )
+        add(
+            "max_queued_messages", "gauge",
+            "the most messages waiting to be sent to a single client",
+            [({}, max(queues, default=0))]
+        )
+        add(
+            "messages_received_total", "counter",
+            "messages received from clients which were dispatched, by type",
+            [({"type": type}, count) for type, count in self.messages.items()]
+        )
+        add(
+            "rejected_messages_total", "counter",
+            "messages turned away, by reason",
+            [
+                ({"reason": reason}, count)
+                for reason, count in network.dispatcher.rejected.items()
+            ]
+        )
+        add(
+            "received_frames_total", "counter",
+            "websocket frames received from clients",
+            [({}, self.frames_received)]
+        )
+        add(
+            "received_bytes_total", "counter",
+            "bytes received from clients",
+            [({}, self.bytes_received)]
+        )
+        add(
+            "sent_bytes_total", "counter",
+            "bytes sent to clients",
+            [({}, self.bytes_sent)]
+        )
+        add(
+            "sent_frames_total", "counter",
+            "websocket frames sent to clients",
+            [({}, self.frames_sent)]
+        )
+
+        name = f"{prefix}_handler_seconds"
+        lines.append(f"# HELP {name} time taken to deal with a message")
+        lines.append(f"# TYPE {name} histogram")
+        for type, histogram in self.handler_times.items():
+            lines.extend(histogram.render(name, dict(labels, type=type)))
+
+        limiter = network.limiter
+        add(
+            "throttled_messages_total", "counter",
+            "messages turned away for going over their rate limit, by type",
+            [
+                ({"type": type}, count)
+                for type, count in limiter.throttled.items()
+            ]
+        )
+        add(
+            "throttled_rooms_total", "counter",
+            "rooms which couldn't be created as too many were being created",
+            [({}, limiter.throttled_rooms)]
+        )
+        add(
+            "flood_disconnects_total", "counter",
+            "clients disconnected for sending too many messages",
+            [({}, limiter.floods)]
+        )
+
+        compression = network.compression
+        add(
+            "compressed_frames_total", "counter",
+            "frames compressed, reused from another client's frame, or " +
+            "sent uncompressed as they were too small",
+            [
+                ({"result": "compressed"}, compression.compressed),
+                ({"result": "shared"}, compression.shared),
+                ({"result": "skipped"}, compression.skipped),
+            ]
+        )
+        add(
+            "compression_bytes_total", "counter",
+            "size of compressed frames, before and after compression",
+            [
+                ({"stage": "before"}, compression.bytes_in),
+                ({"stage": "after"}, compression.bytes_out),
+            ]
+        )
+
+        monitor = network.monitor
+        add(
+            "loop_lag_max_seconds", "gauge",
+            "the longest the event loop has been late to run a timer",
+            [({}, monitor.max_lag)]
+        )
+        add(
+            "loop_stalls_total", "counter",
+            "times the event loop was blocked for too long",
+            [({}, monitor.stalls)]
+        )
+        add(
+            "slow_handlers_total", "counter",
+            "messages which took too long to deal with",
+            [({}, monitor.slow_handlers)]
+        )
+
+        name = f"{prefix}_loop_lag_seconds"
+        lines.append(
+            f"# HELP {name} how late the event loop was to run a timer"
+        )
+        lines.append(f"# TYPE {name} histogram")
+        lines.extend(monitor.lag.render(name, labels))
+
+        name = f"{prefix}_broadcast_enqueue_seconds"
+        lines.append(
+            f"# HELP {name} time taken to queue a broadcast for every " +
+            "recipient"
+        )
+        lines.append(f"# TYPE {name} histogram")
+        lines.extend(network.broadcast.times.render(name, labels))
+
+        name = f"{prefix}_delivery_seconds"
+        lines.append(
+            f"# HELP {name} time messages waited between being queued " +
+            "and being written to the client's socket"
+        )
+        lines.append(f"# TYPE {name} histogram")
+        lines.extend(self.delivery.render(name, labels))
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,101 @@
+"""
+MONITOR CLASS FILE
+this file can be imported by the server network
+it watches the event loop for anything which blocks it, such as reading
+a file or encoding a very large message. Every game runs on the same
+loop, so anything which blocks it holds up every player at once
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from classes.Metrics import Histogram
+
+# how often (in seconds) the loop's lag is measured
+lag_interval = 0.1
+# how long (in seconds) the loop can go without running before it is
+# treated as blocked, and what it is doing is printed
+stall_threshold = 0.25
+# handlers which take longer than this (in seconds) are printed
+slow_handler = 0.1
+
+
+class Monitor:
+    """
+    the monitor measures how late the event loop is to run a timer (the
+    loop lag) every so often. A separate thread checks that the
+    measurements keep happening, and if they stop, the loop is blocked,
+    so the thread prints the loop's stack and the message being dealt with
+    """
+    def __init__(self):
+        self.lag = Histogram()
+        self.last_lag = 0
+        self.max_lag = 0
+        self.stalls = 0
+        self.slow_handlers = 0
+
+        # the type of message being dealt with, if any
+        self.current_type = None
+        # when the loop last measured its lag, and the thread it runs on
+        self.last_beat = time.monotonic()
+        self.loop_thread = None
+
+    # starts measuring the loop's lag, and starts the watchdog thread
+    def start(self):
+        self.loop_thread = threading.get_ident()
+        self.last_beat = time.monotonic()
+        asyncio.ensure_future(self.sample())
+        threading.Thread(target=self.watch, daemon=True).start()
+
+    # measures the loop lag until the server stops
+    async def sample(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(lag_interval)
+            self.last_beat = time.monotonic()
+
+            lag = max(self.last_beat - start - lag_interval, 0)
+            self.lag.observe(lag)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+
+    # the watchdog thread. It checks that the loop is still measuring its
+    # lag, and prints what the loop is doing if it has stopped. Each
+    # stall is only printed once
+    def watch(self):
+        reported = None
+        while True:
+            time.sleep(lag_interval)
+            beat = self.last_beat
+            blocked = time.monotonic() - beat
+            if blocked < stall_threshold or reported == beat:
+                continue
+
+            reported = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self.loop_thread)
+            stack = ""
+            if frame is not None:
+                stack = "".join(traceback.format_stack(frame))
+
+            doing = "a timer or callback"
+            if self.current_type is not None:
+                doing = f"a {self.current_type} message"
+            print(
+                f"event loop blocked for over {blocked * 1000:.0f}ms " +
+                f"while dealing with {doing}:\n{stack}"
+            )
+
+    # records which message type is being dealt with, so a stall can be
+    # put down to it
+    def start_handler(self, type):
+        self.current_type = type
+
+    # prints any handler which took too long
+    def finish_handler(self, type, duration):
+        self.current_type = None
+        if duration > slow_handler:
+            self.slow_handlers += 1
+            print(f"slow handler: {type} took {duration * 1000:.1f}ms")
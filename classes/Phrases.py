@@ -0,0 +1,170 @@
+"""
+PHRASES CLASS FILE
+this file can be imported by the game class
+it loads the phrases which can be guessed in a round, once, when the
+server starts up
+"""
+
+import array
+import random
+
+# stores a reference to the file containing the game's phrases
+phrases_file = "src/phrases"
+# the letters that can be guessed
+alphabet = "abcdefghijklmnopqrstuvwxyz"
+# the letters in the order they most often appear in english, which
+# simulated players guess in
+letter_frequency = "etaoinshrdlcumwfgypbvkjxqz"
+# the most different filters whose results are kept. Players choose the
+# filters for their rooms, so they can't make this grow forever
+max_filters = 64
+
+
+class Phrases:
+    """
+    the phrases class stores every phrase from the phrases file, along
+    with information about each phrase that is worked out when the file
+    is loaded, rather than every time a phrase is used.
+    each piece of information is stored in its own tuple or array, and
+    the phrase's index is used to look it up
+    """
+    def __init__(self, path):
+        with open(path) as file:
+            texts = [line.rstrip() for line in file]
+
+        # the phrase as it appears in the file
+        self.texts = tuple(text for text in texts if len(text) > 0)
+        # the phrase in lowercase, which guesses are compared against
+        self.lowered = tuple(text.lower() for text in self.texts)
+        # the different letters which appear in the phrase
+        self.letters = tuple(
+            frozenset(letter for letter in text if letter in alphabet)
+            for text in self.lowered
+        )
+        # how many letters need to be revealed to finish the phrase
+        self.reveal_counts = array.array(
+            "H",
+            [
+                sum(1 for letter in text if letter in alphabet)
+                for text in self.lowered
+            ]
+        )
+
+        # indexes of the phrases, grouped by their length and by how many
+        # different letters they contain. These are used to filter the
+        # phrases without checking every phrase
+        self.by_length = self.group_by([len(text) for text in self.texts])
+        self.by_letter_count = self.group_by(
+            [len(letters) for letters in self.letters]
+        )
+        self.all_indices = array.array("H", range(len(self.texts)))
+        self.filtered = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    # groups the phrase indexes by the given value for each phrase
+    def group_by(self, values):
+        groups = {}
+        for index, value in enumerate(values):
+            groups.setdefault(value, array.array("H")).append(index)
+        return groups
+
+    # returns the indexes in the groups whose value is within the range.
+    # returns None if there is no range, meaning every phrase matches
+    def get_group_range(self, groups, minimum, maximum):
+        if minimum is None and maximum is None:
+            return None
+
+        indices = set()
+        for value, group in groups.items():
+            if minimum is not None and value < minimum:
+                continue
+            if maximum is not None and value > maximum:
+                continue
+            indices.update(group)
+        return indices
+
+    # returns the indexes of every phrase which matches the filters.
+    # results are stored, so each common filter is only worked out once
+    def get_indices(
+        self, min_length=None, max_length=None,
+        min_letters=None, max_letters=None
+    ):
+        key = (min_length, max_length, min_letters, max_letters)
+        if key in self.filtered:
+            return self.filtered[key]
+
+        indices = None
+        for matching in (
+            self.get_group_range(self.by_length, min_length, max_length),
+            self.get_group_range(
+                self.by_letter_count, min_letters, max_letters
+            ),
+        ):
+            if matching is None:
+                continue
+            indices = matching if indices is None else indices & matching
+
+        if indices is None:
+            result = self.all_indices
+        else:
+            result = array.array("H", sorted(indices))
+
+        if len(self.filtered) < max_filters:
+            self.filtered[key] = result
+        return result
+
+    # returns a new bag to draw phrases from, using the given filters
+    def get_bag(self, **filters):
+        indices = self.get_indices(**filters)
+        if len(indices) == 0:
+            # nothing matches the filters, so any phrase can be used
+            print(f"no phrases match {filters}, using every phrase")
+            indices = self.all_indices
+        return Bag(indices)
+
+
+class Bag:
+    """
+    a bag of phrase indexes which are drawn in a random order without
+    repeating, until the bag is empty, at which point it is refilled.
+    the order is shuffled one draw at a time, and only the positions that
+    have been swapped are stored, so a bag only uses memory for the few
+    phrases a game actually draws
+    """
+    def __init__(self, indices):
+        self.indices = indices
+        self.swapped = {}
+        self.drawn = 0
+
+    # returns the next phrase index from the bag
+    def draw(self):
+        if self.drawn >= len(self.indices):
+            # every phrase has been used, so the bag is refilled
+            self.swapped.clear()
+            self.drawn = 0
+
+        # a step of the fisher-yates shuffle. A random undrawn position is
+        # swapped with the next position to be drawn
+        position = random.randrange(self.drawn, len(self.indices))
+        index = self.swapped.get(position, self.indices[position])
+        self.swapped[position] = self.swapped.get(
+            self.drawn, self.indices[self.drawn]
+        )
+        self.swapped.pop(self.drawn, None)
+        self.drawn += 1
+        return index
+
+
+# the loaded phrases. This is filled in the first time get_phrases is run
+phrases = None
+
+
+# returns the loaded phrases, loading them from the file if they haven't
+# been loaded yet
+def get_phrases():
+    global phrases
+    if phrases is None:
+        phrases = Phrases(phrases_file)
+    return phrases
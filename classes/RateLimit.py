@@ -0,0 +1,112 @@
+"""
+RATE LIMIT CLASS FILE
+this file can be imported by the server network
+it limits how quickly clients can send messages, so a single client
+sending messages as fast as it can can't hold up every other player
+"""
+
+import time
+
+# the most messages of each type a client can send, as (messages per
+# second, burst). The burst is how many can be sent at once before the
+# rate applies. Types which aren't listed are only limited by flood_limit
+message_limits = {
+    "CREATE_ROOM": (1, 3),
+    "JOIN_ROOM": (2, 5),
+    "LEAVE_ROOM": (2, 5),
+    "CHANGE_READY": (2, 5),
+    "SUBMIT_GUESS": (5, 10),
+    "LEAVE_GAME": (2, 5),
+    "SYNC_ROSTER": (1, 3),
+    "SYNC_ROOMS": (2, 5),
+}
+# the most messages of any type a client can send. A client which goes
+# over this is disconnected
+flood_limit = (30, 60)
+# the most rooms that can be created on this process, by every client
+room_limit = (20, 50)
+
+
+class TokenBucket:
+    """
+    a bucket holds up to burst tokens, and is refilled at rate tokens per
+    second. Each message takes a token, and a message arriving when the
+    bucket is empty is over the limit
+    """
+    def __init__(self, rate, burst, now):
+        self.rate, self.burst = rate, burst
+        self.tokens = burst
+        self.last = now
+
+    # takes a token, returning false if there were none left
+    def take(self, now):
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.last) * self.rate
+        )
+        self.last = now
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+
+class RateLimiter:
+    """
+    the rate limiter stores a bucket for each type of message each client
+    sends, and one for all of their messages, in the client's buckets. It
+    also limits how quickly rooms can be created by everyone, and counts
+    everything it turns away
+    """
+    def __init__(self):
+        self.enabled = True
+        self.rooms = TokenBucket(*room_limit, time.monotonic())
+        # how many messages of each type were turned away, how many rooms
+        # couldn't be created, and how many clients were disconnected
+        self.throttled = {}
+        self.throttled_rooms = 0
+        self.floods = 0
+
+    # takes a token from the client's bucket for all of its messages.
+    # this is done for every frame, before it is decoded, so frames which
+    # aren't valid messages count too. Returns true if the client is
+    # flooding and should be disconnected
+    def check_flood(self, client):
+        if not self.enabled:
+            return False
+
+        now = time.monotonic()
+        bucket = client.buckets.get(None)
+        if bucket is None:
+            bucket = client.buckets[None] = TokenBucket(*flood_limit, now)
+        if bucket.take(now):
+            return False
+
+        self.floods += 1
+        return True
+
+    # checks a message from a client against the limit for its type.
+    # returns None if it is allowed, or "RATE_LIMITED" if it should be
+    # turned away
+    def check(self, client, type):
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        buckets = client.buckets
+        if not isinstance(type, str) or type not in message_limits:
+            return None
+        if type not in buckets:
+            buckets[type] = TokenBucket(*message_limits[type], now)
+        if not buckets[type].take(now):
+            self.throttled[type] = self.throttled.get(type, 0) + 1
+            return "RATE_LIMITED"
+        return None
+
+    # returns true if a room can be created
+    def allow_room(self):
+        if not self.enabled or self.rooms.take(time.monotonic()):
+            return True
+
+        self.throttled_rooms += 1
+        return False
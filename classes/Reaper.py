@@ -0,0 +1,85 @@
+"""
+REAPER CLASS FILE
+this file can be imported by the server network
+it disconnects clients which have been idle for too long, such as a tab
+left open on the room list. Pings only show that the connection is still
+open, so an abandoned tab would otherwise keep its place in a room, and
+keep being sent every change to the room list, forever
+"""
+
+import asyncio
+import os
+
+# how long (in seconds) a client in each location can go without sending
+# a message before it is disconnected. A game skips the turn of a player
+# who doesn't guess in time, but never ends while anybody is still in it,
+# so players in a game are reaped too. A timeout of 0 turns reaping off
+# for that location
+idle_timeouts = {
+    "ROOM_LIST": float(os.environ.get("IDLE_TIMEOUT_ROOM_LIST", 900)),
+    "ROOM": float(os.environ.get("IDLE_TIMEOUT_ROOM", 600)),
+    "GAME": float(os.environ.get("IDLE_TIMEOUT_GAME", 600)),
+}
+# how often (in seconds) idle clients are looked for
+reap_interval = 30
+# the most clients disconnected at once. If there are more, the rest are
+# disconnected straight after, so other work can run in between
+reap_batch = 100
+
+
+class Reaper:
+    """
+    the reaper checks every client in a location with an idle timeout
+    every so often, and disconnects those which haven't sent a message
+    within it. Clients record when they last sent a message, so checking
+    them costs nothing until the reaper runs
+    """
+    def __init__(self, network):
+        self.network = network
+        self.timers = network.scheduler.group()
+        # the number of clients disconnected for being idle
+        self.reaped = 0
+
+    # starts looking for idle clients
+    def start(self):
+        self.timers.schedule(reap_interval, self.reap)
+
+    # returns every client which has been idle for too long
+    def get_idle(self):
+        now = self.network.scheduler.time()
+        idle = []
+        for location, timeout in idle_timeouts.items():
+            if timeout <= 0:
+                continue
+            for client in self.network.locations.get(location, ()):
+                if now - client.last_active > timeout:
+                    idle.append(client)
+        return idle
+
+    # disconnects a batch of idle clients, then waits for the next check
+    async def reap(self):
+        idle = self.get_idle()
+        delay = reap_interval
+        try:
+            for client in idle[:reap_batch]:
+                # disconnecting one client can move another, such as by
+                # removing the room they were both in
+                if client.location is not None:
+                    await self.disconnect(client)
+            if len(idle) > reap_batch:
+                # the rest are disconnected once other work has run
+                delay = 0
+        finally:
+            self.timers.schedule(delay, self.reap)
+
+    # tells a client why it is being disconnected, then disconnects it
+    # and closes its socket
+    async def disconnect(self, client):
+        self.reaped += 1
+        socket = client.socket
+        await client.error("You were disconnected for being idle", "IDLE")
+        # anything sent to the client from here on is dropped
+        client.closing = True
+        await client.disconnect()
+        if socket is not None:
+            asyncio.ensure_future(socket.close())
@@ -3,6 +3,14 @@ ROOMS CLASS FILE
 this can be used to import the rooms class into the main server file
 """
 
+from classes.Backends import LocalBackend
+from classes.Roster import Roster
+from classes.Codec import Payload
+
+# how long (in seconds) changes to the room list are collected for before
+# they are sent to clients, so a burst of changes is sent together
+lobby_tick = 0.1
+
 
 class Rooms:
     """
@@ -22,18 +30,25 @@ class Rooms:
         to connect the clients to a game
         """
 
-        def __init__(self, name, room_handler):
+        def __init__(self, name, room_handler, phrase_filter=None):
             self.connected = set()
             self.room_handler = room_handler
 
             self.name = name
+            self.id = room_handler.backend.new_room_id()
             self.min_players = 2
             self.max_players = 8
-
-        # returns a unique hash (id) of the room as well as the name
+            self.started = False
+            self.roster = Roster("ROOM", "ROOM_CONNECTED_UPDATE")
+            # limits on the phrases used in the game, such as
+            # {"min_length": 10}, chosen by the player who created the
+            # room. An empty filter allows every phrase
+            self.phrase_filter = phrase_filter or {}
+
+        # returns the unique id of the room as well as the name
         # used for sending a list of rooms to clients
         def get_data(self):
-            return {"HASH": hash(self), "NAME": self.name}
+            return {"HASH": self.id, "NAME": self.name}
 
         # used to connect a client to the room
         async def add_client(self, client):
@@ -62,12 +77,7 @@ class Rooms:
             client.room = None
             client.ready = False
             try:
-                await client.send(
-                    {
-                        "TYPE": "LOAD_ROOMS",
-                        "DATA": self.room_handler.get_room_list()
-                    }
-                )
+                await client.send_payload(self.room_handler.get_snapshot())
             except:
                 print("client was disconnected")
             if len(self.connected) == 0:
@@ -77,27 +87,30 @@ class Rooms:
             await self.update_clients()
 
         # this function is used to generate and send information about
-        # the clients connected to the room
+        # the clients connected to the room. Clients who support it are
+        # only sent what has changed
         async def update_clients(self):
-            for client in self.connected:
-                client_info = {}
-                client_id = 0
-                for other in self.connected:
-                    info = {
-                        "NAME": other.name,
-                        "READY": other.ready,
-                        "YOU": other == client,
-                    }
-                    client_info[client_id] = info
-                    client_id += 1
-                await client.send(
-                    {"TYPE": "ROOM_CONNECTED_UPDATE", "DATA": client_info}
-                )
+            await self.room_handler.backend.set_players(
+                self.id, len(self.connected)
+            )
+
+            await self.roster.send(
+                self.room_handler.network.broadcast,
+                [
+                    (client, {"NAME": client.name, "READY": client.ready})
+                    for client in self.connected
+                ]
+            )
 
         # this function is run whenever a client changes their status to
         # ready. If a game is allowed to start, it will return true
         # the server network class deals with starting the game
         async def start_game(self):
+            # two clients readying up at the same time must not both
+            # start a game
+            if self.started:
+                return False
+
             if len(self.connected) < self.min_players:
                 return False
 
@@ -105,37 +118,111 @@ class Rooms:
                 if not client.ready:
                     return False
 
+            self.started = True
             return True
 
-    def __init__(self, network):
+    def __init__(self, network, backend=None):
+        # the rooms on this process, by their id
         self.rooms = {}
         self.network = network
 
-    # returns a list of all rooms being tracked, + an identifying hash
+        # the backend stores the state shared with other processes. By
+        # default this is only stored in this process
+        self.backend = backend if backend is not None else LocalBackend()
+        self.backend.subscribe(self.update_rooms)
+
+        # the room list as it was last sent to clients, and its version.
+        # the version goes up by one each time changes are sent. The
+        # payload is the whole list, which is only encoded once for each
+        # version
+        self.version = 0
+        self.snapshot = {}
+        self.payload = self.make_payload()
+        self.timers = network.scheduler.group()
+        self.update_timer = None
+
+    # returns a list of all rooms being tracked, + an identifying hash.
+    # when the backend is shared, this includes other processes' rooms
     def get_room_list(self):
-        return [
-            {"NAME": self.rooms[id].name, "HASH": hash(self.rooms[id])}
-            for id in self.rooms
-        ]
+        return self.backend.get_room_list()
+
+    # returns the payload containing the whole room list. This is sent
+    # when a client arrives at the room list, or has missed an update
+    def get_snapshot(self):
+        return self.payload
+
+    # makes the payload for the current version of the room list
+    def make_payload(self):
+        return Payload(
+            {
+                "TYPE": "LOAD_ROOMS",
+                "DATA": list(self.snapshot.values()),
+                "VERSION": self.version,
+            }
+        )
 
-    # sends an update of the currently active rooms to all connected
-    # clients
+    # this is run by the backend whenever the room list changes. The
+    # changes are sent once the lobby tick is up, together with any other
+    # changes that happen in the meantime
     async def update_rooms(self):
-        await self.network.send_all(
-            {"TYPE": "LOAD_ROOMS", "DATA": self.get_room_list()}, "ROOM_LIST"
+        if self.update_timer is None:
+            self.update_timer = self.timers.schedule(
+                lobby_tick, self.send_changes
+            )
+
+    # sends the changes to the room list to all clients on the room list.
+    # clients which support it are only sent what has changed, and the
+    # rest are sent the whole list
+    async def send_changes(self):
+        self.update_timer = None
+
+        # the entries are copied, so later changes can be compared
+        rooms = {room["HASH"]: dict(room) for room in self.get_room_list()}
+        added = [room for id, room in rooms.items() if id not in self.snapshot]
+        removed = [id for id in self.snapshot if id not in rooms]
+        updated = [
+            room for id, room in rooms.items()
+            if id in self.snapshot and self.snapshot[id] != room
+        ]
+        if len(added) + len(removed) + len(updated) == 0:
+            return
+
+        self.version += 1
+        self.snapshot = rooms
+        self.payload = self.make_payload()
+
+        clients = self.network.get_clients("ROOM_LIST")
+        await self.network.broadcast.send(
+            [client for client in clients if "ROOMS_DELTA" in client.features],
+            {
+                "TYPE": "ROOMS_DELTA",
+                "DATA": {
+                    "VERSION": self.version,
+                    "ADDED": added,
+                    "REMOVED": removed,
+                    "UPDATED": updated,
+                },
+            }
+        )
+        await self.network.broadcast.send_payload(
+            [
+                client for client in clients
+                if "ROOMS_DELTA" not in client.features
+            ],
+            self.payload
         )
 
     # creates and tracks a new room
-    async def add_room(self, name):
-        room = self.Room(name, self)
-        self.rooms[hash(room)] = room
-        await self.update_rooms()
+    async def add_room(self, name, phrase_filter=None):
+        room = self.Room(name, self, phrase_filter)
+        self.rooms[room.id] = room
+        await self.backend.add_room(room.id, room.name)
         return room
 
     # removes and untracks a room
     async def remove_room(self, room):
-        if hasattr(self, 'rooms'):
-            if hash(room) in self.rooms:
-                self.rooms.pop(hash(room))
+        if room.id not in self.rooms:
+            return
 
-        await self.update_rooms()
+        self.rooms.pop(room.id)
+        await self.backend.remove_room(room.id)
@@ -0,0 +1,189 @@
+"""
+ROSTER CLASS FILE
+this file can be imported by the rooms and game classes
+it handles sending the list of people in a room or game to its clients
+"""
+
+import itertools
+import json
+
+
+class Roster:
+    """
+    the roster stores the people in a room or game, along with their
+    details (such as their score), and whose turn it is. Each time it is
+    updated, the changes are worked out once and given a version number.
+    clients which support it are sent the whole roster when they join, and
+    after that only the changes. Other clients are sent the whole roster
+    every time, in the original format
+    """
+    def __init__(self, name, legacy_type, turns=False):
+        self.type = f"{name}_ROSTER"
+        self.delta_type = f"{name}_ROSTER_DELTA"
+        self.legacy_type = legacy_type
+        self.turns = turns
+
+        self.version = 0
+        self.counter = itertools.count()
+        # the id given to each client, and the details stored for each id
+        self.ids = {}
+        self.entries = {}
+        self.turn = None
+        # the clients which have been sent the whole roster
+        self.synced = set()
+
+    # stores the new details of every member. members is a list of
+    # (client, details) pairs, and turn is the client whose turn it is.
+    # returns the changes since the last update, or None if nothing changed
+    def update(self, members, turn=None):
+        changed = {}
+        entries = {}
+        for client, entry in members:
+            if client in self.ids:
+                id = self.ids[client]
+                old = self.entries[id]
+                difference = {
+                    key: value for key, value in entry.items()
+                    if old.get(key) != value
+                }
+                if len(difference) > 0:
+                    changed[id] = difference
+            else:
+                id = next(self.counter)
+                self.ids[client] = id
+                changed[id] = entry
+            entries[id] = entry
+
+        removed = [id for id in self.entries if id not in entries]
+        for client in [
+            client for client, id in self.ids.items() if id not in entries
+        ]:
+            self.ids.pop(client)
+            self.synced.discard(client)
+        self.entries = entries
+
+        delta = {}
+        if len(changed) > 0:
+            delta["CHANGED"] = changed
+        if len(removed) > 0:
+            delta["REMOVED"] = removed
+        turn = self.ids.get(turn)
+        if turn != self.turn:
+            self.turn = turn
+            delta["TURN"] = turn
+
+        if len(delta) == 0:
+            return None
+
+        self.version += 1
+        delta["VERSION"] = self.version
+        return delta
+
+    # makes sure the client is sent the whole roster next time
+    def resync(self, client):
+        self.synced.discard(client)
+
+    # updates the roster, and sends each member whatever they need:
+    # the changes, the whole roster, or the roster in the original format
+    async def send(self, broadcast, members, turn=None):
+        delta = self.update(members, turn)
+
+        legacy, snapshots, deltas = [], [], []
+        for client, entry in members:
+            if "ROSTER_DELTA" not in client.features:
+                legacy.append(client)
+            elif client in self.synced:
+                deltas.append(client)
+            else:
+                snapshots.append(client)
+
+        if delta is not None and len(deltas) > 0:
+            await broadcast.send(
+                deltas, {"TYPE": self.delta_type, "DATA": delta}
+            )
+
+        if len(snapshots) > 0:
+            # the roster is encoded once, and only the id of the recipient
+            # is different in each message. Clients using another codec
+            # have theirs encoded separately
+            entries = json.dumps(self.entries)
+            broadcast.fan_out(
+                [
+                    (
+                        client,
+                        client.codec.encode(self.get_snapshot(client))
+                        if client.codec.compact else
+                        f'{{"TYPE": "{self.type}", "DATA": ' +
+                        f'{{"VERSION": {self.version}, ' +
+                        f'"YOU": {self.ids[client]}, ' +
+                        f'"TURN": {json.dumps(self.turn)}, ' +
+                        f'"PLAYERS": {entries}}}}}'
+                    )
+                    for client in snapshots
+                ],
+                self.type
+            )
+            self.synced.update(snapshots)
+
+        if delta is not None and len(legacy) > 0:
+            broadcast.fan_out(
+                self.encode_legacy(members, turn, legacy), self.legacy_type
+            )
+
+    # returns the whole roster, as sent to the client
+    def get_snapshot(self, client):
+        return {
+            "TYPE": self.type,
+            "DATA": {
+                "VERSION": self.version,
+                "YOU": self.ids[client],
+                "TURN": self.turn,
+                "PLAYERS": self.entries,
+            },
+        }
+
+    # builds the roster in the original format for each recipient. Every
+    # entry is encoded once with YOU set to false and once with it set to
+    # true, and each recipient's message is joined together from those.
+    # for compact clients the entries are encoded once as a list, and each
+    # recipient is only sent their position in it
+    def encode_legacy(self, members, turn, recipients):
+        entries = []
+        rows = []
+        positions = {}
+        for index, (client, entry) in enumerate(members):
+            info = dict(entry)
+            if self.turns:
+                info["IS_TURN"] = client == turn
+            rows.append(list(info.values()))
+            positions[client] = index
+            info["YOU"] = False
+            other = f'"{index}": {json.dumps(info)}'
+            info["YOU"] = True
+            you = f'"{index}": {json.dumps(info)}'
+            entries.append((client, other, you))
+
+        encoded = {}
+        messages = []
+        for recipient in recipients:
+            codec = recipient.codec
+            if not codec.compact:
+                messages.append((
+                    recipient,
+                    f'{{"TYPE": "{self.legacy_type}", "DATA": {{' +
+                    ", ".join(
+                        you if client == recipient else other
+                        for client, other, you in entries
+                    ) +
+                    "}}"
+                ))
+                continue
+
+            if codec not in encoded:
+                encoded[codec] = codec.encode_legacy_roster(
+                    self.legacy_type, rows
+                )
+            messages.append(
+                (recipient, f"{encoded[codec]}{positions[recipient]}]")
+            )
+        return messages
@@ -0,0 +1,154 @@
+"""
+SCHEDULER CLASS FILE
+this file can be imported by the server network and game classes
+it handles running delayed events, such as moving onto the next turn
+"""
+
+import asyncio
+import heapq
+import itertools
+import traceback
+
+
+class Scheduler:
+    """
+    the scheduler stores every delayed event for every game in a single
+    heap, ordered by when they are due. Only one timer is ever set on the
+    event loop, for whichever event is due first, so thousands of games
+    waiting on their next turn only cost a few timers
+    """
+
+    class Timer:
+        """
+        a timer is a single delayed event. It runs a coroutine function
+        when it is due, unless it has been cancelled
+        """
+        def __init__(self, group, when, function, args):
+            self.group = group
+            self.when = when
+            self.function, self.args = function, args
+            self.cancelled = False
+
+        # stops the timer from running. It is left in the heap, and is
+        # skipped over once it is due
+        def cancel(self):
+            self.cancelled = True
+            self.group.timers.discard(self)
+
+    class Group:
+        """
+        a group of timers and the tasks they have started. Each game has
+        its own group, so all of its events can be cancelled at once when
+        the game ends
+        """
+        def __init__(self, scheduler):
+            self.scheduler = scheduler
+            self.timers = set()
+            self.tasks = set()
+            self.cancelled = False
+
+        # runs the coroutine function with the given arguments after
+        # delay seconds. Nothing is scheduled once the group is cancelled
+        def schedule(self, delay, function, *args):
+            if self.cancelled:
+                return None
+
+            timer = self.scheduler.add(self, delay, function, args)
+            self.timers.add(timer)
+            return timer
+
+        # cancels every timer which hasn't run yet, as well as any task
+        # started by a timer which is still running. If the group is
+        # cancelled by one of its own tasks, that task is left to finish
+        def cancel(self):
+            self.cancelled = True
+            for timer in list(self.timers):
+                timer.cancel()
+            for task in list(self.tasks):
+                if task is not asyncio.current_task():
+                    task.cancel()
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.handle = None
+        self.handle_when = None
+
+    # returns the event loop that the timers are run on
+    def get_loop(self):
+        return asyncio.get_event_loop()
+
+    # returns the current time, which timers are due relative to
+    def time(self):
+        return self.get_loop().time()
+
+    # creates a new group of timers
+    def group(self):
+        return self.Group(self)
+
+    # adds a timer to the heap, and makes sure the event loop will wake
+    # up in time to run it
+    def add(self, group, delay, function, args):
+        when = self.time() + delay
+        timer = self.Timer(group, when, function, args)
+        # the counter keeps timers due at the same time in the order
+        # they were added
+        heapq.heappush(self.heap, (when, next(self.counter), timer))
+        self.arm()
+        return timer
+
+    # sets the event loop timer for the earliest event in the heap
+    def arm(self):
+        while len(self.heap) > 0 and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+
+        if len(self.heap) == 0:
+            return
+
+        when = self.heap[0][0]
+        if self.handle is not None:
+            if self.handle_when <= when:
+                return
+            self.handle.cancel()
+
+        self.handle_when = when
+        self.handle = self.get_loop().call_at(when, self.run_due)
+
+    # runs every timer which is due, then sets the event loop timer for
+    # the next one
+    def run_due(self):
+        self.handle = None
+        now = self.time()
+
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            timer = heapq.heappop(self.heap)[2]
+            if timer.cancelled:
+                continue
+
+            timer.group.timers.discard(timer)
+            self.start(timer)
+
+        self.arm()
+
+    # runs a timer's coroutine function as a task, which is tracked by
+    # the timer's group until it finishes
+    def start(self, timer):
+        task = asyncio.ensure_future(timer.function(*timer.args))
+        timer.group.tasks.add(task)
+        task.add_done_callback(
+            lambda task, group=timer.group: self.task_done(group, task)
+        )
+        return task
+
+    # untracks a finished task, and prints any error it raised, as there
+    # is nothing else waiting on it that could handle the error
+    def task_done(self, group, task):
+        group.tasks.discard(task)
+        if task.cancelled():
+            return
+
+        exception = task.exception()
+        if exception is not None:
+            traceback.print_exception(
+                type(exception), exception, exception.__traceback__
+            )
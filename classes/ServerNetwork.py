@@ -12,13 +12,91 @@ import asyncio
 import json
 import os
 import traceback
+import collections
+import itertools
+import secrets
+import time
 from classes.Rooms import Rooms
 from classes.Game import Game
+from classes.Broadcast import Broadcast
+from classes.Scheduler import Scheduler
+from classes.Phrases import get_phrases
+from classes.Workers import Worker
+from classes.Backends import SharedBackend
+from classes.Metrics import Metrics
+from classes.Monitor import Monitor
+from classes.Dispatcher import Dispatcher, Field, Choice
+from classes.RateLimit import RateLimiter
+from classes.Codec import get_codec, codec_table
+from classes.Compression import Compression
+from classes.Reaper import Reaper
 
-# env variables for testing if the program has been deployed
-on_heroku = False
-if "RUNNING_ON_HEROKU" in os.environ:
-    on_heroku = True
+# the limits a player can put on the phrases used in their room's games,
+# and the names the phrases class knows them by
+phrase_filters = {
+    "MIN_LENGTH": "min_length",
+    "MAX_LENGTH": "max_length",
+    "MIN_LETTERS": "min_letters",
+    "MAX_LETTERS": "max_letters",
+}
+# the most websocket connections this process keeps open at once, and
+# the most of those which haven't logged in yet. Connections over either
+# limit are turned away before the websocket is opened
+max_connections = int(os.environ.get("MAX_CONNECTIONS", 5000))
+max_pending = int(os.environ.get("MAX_PENDING_CONNECTIONS", 500))
+# how long (in seconds) a new connection has to log in or resume before
+# it is closed
+login_timeout = 10
+# how long (in seconds) a connection which was turned away is asked to
+# wait before trying again
+retry_after = 5
+# how often (in seconds) each connection is pinged, and how long it has
+# to reply before it is treated as dropped
+ping_interval = float(os.environ.get("PING_INTERVAL", 20))
+ping_timeout = float(os.environ.get("PING_TIMEOUT", 20))
+# the largest message (in bytes) a client can send, and how many of its
+# messages can be waiting to be read. Every message is small, so these
+# keep how much memory a connection can use low
+max_message_size = 4096
+max_read_queue = 8
+# the most messages that can be waiting to be sent to a single client.
+# a client that falls this far behind is disconnected
+max_queued = 256
+# the longest a single message can take to be written to a client's
+# socket before the client is treated as stalled and disconnected
+send_timeout = 10
+# how long (in seconds) a client who supports resuming keeps their place
+# in a room or game after their connection drops
+resume_grace = 30
+# message types that describe the whole state of something. Only the
+# latest copy of these needs to be sent, so a newer copy replaces an
+# older one that is still waiting in the queue
+snapshot_types = {
+    "GAME_CONNECTED_UPDATE",
+    "ROOM_CONNECTED_UPDATE",
+    "UPDATE_PHRASE",
+    "LOAD_ROOMS",
+}
+# frames sent before a client has logged in, which never change. They are
+# always plain json, as the client hasn't chosen a codec yet
+connected_frame = json.dumps({"TYPE": "CONNECTED"})
+resume_failed_frame = json.dumps({"TYPE": "RESUME_FAILED"})
+no_name_frame = json.dumps(
+    {"TYPE": "ERROR", "DATA": "ERROR: Please input a username"}
+)
+long_name_frame = json.dumps(
+    {"TYPE": "ERROR", "DATA": "ERROR: Input a shorter name"}
+)
+login_timeout_frame = json.dumps(
+    {"TYPE": "ERROR", "DATA": "ERROR: Took too long to log in"}
+)
+login_failed_frame = json.dumps(
+    {
+        "TYPE": "ERROR",
+        "DATA": "ERROR: An unexpected error occured while attempting to " +
+        "login.",
+    }
+)
 
 
 class Network:
@@ -28,35 +106,283 @@ class Network:
     """
     class Client:
         """
-        this stores the connection information on the player
+        this stores the connection information on the player.
+        messages sent to the client are put in a queue, which is written
+        to the websocket by the client's own writer task. This means game
+        logic never has to wait on a slow connection
         """
-        def __init__(self, network, socket, path, name, location):
+        def __init__(
+            self, network, socket, path, name, location, features=()
+        ):
             self.network = network
             self.socket, self.path, self.name = socket, path, name
+            # optional parts of the protocol the client supports, which it
+            # asked for when logging in
+            self.features = set(features)
+            # how messages to and from the client are encoded
+            self.codec = get_codec(self.features)
             self.game = None
             self.room = None
+            self.current_location = None
             self.location = location
             self.ready = False
             self.game = None
             self.player = None
 
+            # when running with several workers, remote is the worker
+            # whose room the client is in, if it isn't this worker
+            self.id = next(network.client_ids)
+            self.remote = None
+
+            # clients which support resuming are given a token, which they
+            # can use to take this client back after reconnecting. The
+            # expiry is the timer which ends the session if they don't
+            self.token = None
+            self.expiry = None
+
+            # each entry in the queue is a [type, message, queued at] list,
+            # so that a queued snapshot can be found and replaced with a
+            # newer one, and how long each message waited can be measured
+            self.queue = collections.deque()
+            self.queued_snapshots = {}
+            self.queue_event = asyncio.Event()
+            # the entries in the frame currently being written, so they
+            # can be sent again if the connection drops part way through
+            self.unsent = []
+            self.closing = False
+            # the rate limiter's buckets for the client's messages, and
+            # when the client last sent a message
+            self.buckets = {}
+            self.last_active = network.scheduler.time()
+            self.writer = asyncio.ensure_future(self.write_queue())
+
             network.connected.add(self)
 
-        # causes an error popup to appear on the client's GUI
-        async def error(self, message):
-            await self.send({"TYPE": "ERROR", "DATA": f"ERROR: {message}"})
+        # the location is where the client is (on the room list, in a room,
+        # or in a game). Changing it moves the client into that location's
+        # group in the network, so clients can be found by location without
+        # checking every client
+        @property
+        def location(self):
+            return self.current_location
+
+        @location.setter
+        def location(self, location):
+            locations = self.network.locations
+            if self.current_location is not None:
+                locations[self.current_location].discard(self)
+            self.current_location = location
+            if location is not None:
+                locations.setdefault(location, set()).add(self)
+
+        # causes an error popup to appear on the client's GUI. The code
+        # and the type of message which caused the error are included, if
+        # given, so newer clients can tell what went wrong
+        async def error(self, message, code=None, type=None):
+            data = {"TYPE": "ERROR", "DATA": f"ERROR: {message}"}
+            if code is not None:
+                data["CODE"], data["FOR"] = code, type
+            await self.send(data)
 
         # encodes and sends data to the client
         async def send(self, data):
-            await self.socket.send(json.dumps(data))
+            self.enqueue(self.codec.encode(data), data.get("TYPE"))
+
+        # sends a payload, encoded with the client's codec
+        async def send_payload(self, payload):
+            self.enqueue(payload.encode(self.codec), payload.type)
+
+        # adds an encoded message to the client's queue. Snapshot messages
+        # replace any older copy which hasn't been sent yet. The older
+        # copy is removed and the new one goes at the end of the queue, so
+        # the snapshot still arrives after anything queued before it
+        def enqueue(self, message, type=None):
+            if self.closing:
+                return
+
+            if type in snapshot_types and type in self.queued_snapshots:
+                self.queue.remove(self.queued_snapshots.pop(type))
+
+            if len(self.queue) >= max_queued:
+                # the client isn't keeping up, so it is disconnected
+                # rather than letting its queue grow forever. Too much has
+                # been missed for the session to be resumed
+                print(f"{self.name}'s queue overflowed, disconnecting")
+                self.kick(1008, "too many messages waiting to be sent")
+                return
+
+            entry = [type, message, self.network.scheduler.time()]
+            self.queue.append(entry)
+            if type in snapshot_types:
+                self.queued_snapshots[type] = entry
+            self.queue_event.set()
+
+        # disconnects the client without waiting, and without letting it
+        # resume. Nothing else is added to its queue. The close code and
+        # reason tell the client why it was disconnected, and flushing
+        # sends what is already queued (such as an error) before closing
+        def kick(self, code=1000, reason="", flush=False):
+            self.closing = True
+            self.network.sessions.pop(self.token, None)
+            if self.socket is None:
+                asyncio.ensure_future(self.disconnect())
+            else:
+                asyncio.ensure_future(self.close(code, reason, flush))
+
+        # closes the client's socket, which makes the listener loop
+        # disconnect the client
+        async def close(self, code=1000, reason="", flush=False):
+            socket = self.socket
+            if flush:
+                await self.flush()
+            await socket.close(code, reason)
+
+        # removes the next entry from the queue
+        def dequeue(self):
+            entry = self.queue.popleft()
+            if self.queued_snapshots.get(entry[0]) is entry:
+                del self.queued_snapshots[entry[0]]
+            return entry
 
-        # waits to recieve data from the client, and decodes it
-        async def recv(self):
-            #  return await self.socket.recv()
-            return json.loads(await self.socket.recv())
+        # removes the next frame to send from the queue. Clients which
+        # asked for batching are sent everything waiting in the queue as a
+        # single json array, even if only one message is waiting, so every
+        # message from one step of the game is sent together. Other clients
+        # are sent one message per frame
+        def dequeue_frame(self):
+            if "BATCH" not in self.features:
+                self.unsent = [self.dequeue()]
+                return self.unsent[0][1]
+
+            entries = []
+            while len(self.queue) > 0:
+                entries.append(self.dequeue())
+            self.unsent = entries
+            return "[" + ",".join(entry[1] for entry in entries) + "]"
+
+        # the writer task. This sends queued messages to the client's
+        # websocket until the client disconnects. The task only runs once
+        # the current step of the game has finished adding messages
+        async def write_queue(self):
+            try:
+                while True:
+                    while len(self.queue) == 0:
+                        self.queue_event.clear()
+                        await self.queue_event.wait()
+
+                    await self.write(self.dequeue_frame())
+                    self.unsent = []
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # the socket has stalled or closed. Closing it makes the
+                # listener loop disconnect the client. Clients which can
+                # resume keep collecting messages to be sent afterwards
+                if not self.is_resumable():
+                    self.closing = True
+                await self.socket.close()
+
+        # writes a single frame to the client's socket. The messages are
+        # json with only ascii characters, so their length is their size
+        async def write(self, frame):
+            await asyncio.wait_for(self.socket.send(frame), send_timeout)
+            now = self.network.scheduler.time()
+            self.network.metrics.record_sent(
+                len(frame), [now - entry[2] for entry in self.unsent]
+            )
+
+        # stops the writer task, and tries to send anything left in the
+        # queue (such as an error message) before the socket closes
+        async def flush(self):
+            self.writer.cancel()
+            try:
+                while self.socket is not None and len(self.queue) > 0:
+                    await self.write(self.dequeue_frame())
+            except Exception:
+                pass
+            self.queue.clear()
+            self.queued_snapshots.clear()
+
+        # returns true if the client can still be resumed with its token
+        def is_resumable(self):
+            return (
+                self.token is not None and
+                self.network.sessions.get(self.token) is self
+            )
+
+        # stops writing to the current socket. Any messages which were
+        # being written when it stopped are put back at the front of the
+        # queue, so they are sent to the next socket
+        def release_socket(self):
+            self.writer.cancel()
+            for _, message, queued in reversed(self.unsent):
+                self.queue.appendleft([None, message, queued])
+            self.unsent = []
+            self.socket = None
+
+        # keeps the client's place after its connection has dropped.
+        # messages keep being queued, and if the client doesn't resume
+        # within the grace period it is disconnected
+        def suspend(self):
+            self.release_socket()
+            self.expiry = self.network.session_timers.schedule(
+                resume_grace, self.expire
+            )
+
+        # ends the session of a client who didn't resume in time
+        async def expire(self):
+            self.expiry = None
+            self.network.sessions.pop(self.token, None)
+            await self.disconnect()
+
+        # moves the client onto a new socket. The client is sent
+        # everything it missed, which is still waiting in the queue, after
+        # a message with the versions of the room list and its roster it
+        # will have once it has caught up
+        def resume(self, socket):
+            if self.expiry is not None:
+                self.expiry.cancel()
+                self.expiry = None
+            if self.socket is not None:
+                # the client reconnected before the old connection was
+                # noticed to have dropped
+                old_socket = self.socket
+                self.release_socket()
+                asyncio.ensure_future(old_socket.close())
+
+            roster = None
+            if self.game is not None:
+                roster = self.game.roster.version
+            elif self.room is not None:
+                roster = self.room.roster.version
+            self.queue.appendleft([
+                None,
+                self.codec.encode({
+                    "TYPE": "RESUMED",
+                    "DATA": {
+                        "LOCATION": self.location,
+                        "ROOMS": self.network.rooms.version,
+                        "ROSTER": roster,
+                    },
+                }),
+                self.network.scheduler.time(),
+            ])
+
+            self.socket = socket
+            self.closing = False
+            self.writer = asyncio.ensure_future(self.write_queue())
+            self.queue_event.set()
 
         # disconnects the client from the server
         async def disconnect(self):
+            self.network.sessions.pop(self.token, None)
+            if self.expiry is not None:
+                self.expiry.cancel()
+                self.expiry = None
+
+            if self.remote is not None:
+                self.network.worker.detach(self)
+
             if self.game is not None:
                 await self.game.player_handler.remove_player(self.player)
 
@@ -68,85 +394,192 @@ class Network:
             if self.room is not None:
                 await self.room.remove_client(self)
 
-    def __init__(self, ip: str = "0.0.0.0", port: int = 5555):
+            self.location = None
+            await self.flush()
+
+    def __init__(
+        self, ip: str = "0.0.0.0", port: int = 5555,
+        worker_id=None, coordinator_path=None, scheduler=None
+    ):
         self.ip, self.port = ip, port
         self.sockets = set()
+        # the open sockets which haven't logged in or resumed yet
+        self.pending = set()
+        # connections are turned away until the server has finished
+        # starting up
+        self.ready = False
         self.connected = set()
+        # the connected clients, grouped by their location
+        self.locations = {"ROOM_LIST": set(), "ROOM": set(), "GAME": set()}
+        self.client_ids = itertools.count()
+        self.broadcast = Broadcast()
+        self.metrics = Metrics()
+        # watches for anything blocking the event loop. It is started
+        # once the server is running
+        self.monitor = Monitor()
+        self.dispatcher = Dispatcher()
+        self.add_handlers()
+        self.limiter = RateLimiter()
+        # how messages are compressed, set with environment variables
+        self.compression = Compression()
+        # a different scheduler can be given, such as one which runs in
+        # simulated time
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        # every game which is currently being played
+        self.games = set()
+        # clients which can be resumed, by their token, and the timers
+        # which end their sessions
+        self.sessions = {}
+        self.session_timers = self.scheduler.group()
+        # disconnects idle clients. It is started once the server is
+        # running
+        self.reaper = Reaper(self)
+
+        # the worker is only used when the server is running as several
+        # processes sharing the same port
+        self.worker = None
+        if worker_id is not None:
+            self.worker = Worker(self, worker_id, coordinator_path)
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.rooms = Rooms(self)
+
+        # with several workers, the state of the rooms is shared through
+        # the coordinator
+        if self.worker is not None:
+            self.rooms = Rooms(self, SharedBackend(self.worker))
+        else:
+            self.rooms = Rooms(self)
+        # the phrases are loaded before any games start, so that no game
+        # has to wait on reading the file
+        get_phrases()
 
     # binds the server to the port and ip address, and starts the
     # asynchronous event loop
     def bind(self):
         print("initializing server...")
 
+        # reuse_port lets every worker process listen on the same port
         self.server = websockets.serve(
             self.client_init,
             self.ip,
             self.port,
-            process_request=self.health_check
+            process_request=self.health_check,
+            reuse_port=self.worker is not None,
+            compression=None,
+            extensions=self.compression.get_extensions(),
+            ping_interval=ping_interval,
+            ping_timeout=ping_timeout,
+            max_size=max_message_size,
+            max_queue=max_read_queue
         )
 
         asyncio.get_event_loop().run_until_complete(self.server)
+        self.monitor.start()
+        self.reaper.start()
+        if self.worker is not None:
+            asyncio.get_event_loop().run_until_complete(self.worker.connect())
+        self.ready = True
         print(f"server initialized succesfully on {self.ip}:{self.port}")
 
         asyncio.get_event_loop().run_forever()
 
-    # returns the health status of the connection in an http header
+    # returns the health status of the connection in an http header, or
+    # the server's metrics. Websocket connections the server can't take
+    # are turned away here, before the websocket is opened
     async def health_check(self, path, request_headers):
         if path == "/health/":
+            if not self.ready:
+                return http.HTTPStatus.SERVICE_UNAVAILABLE, [], b"STARTING\n"
             return http.HTTPStatus.OK, [], b"OK\n"
+        if path == "/metrics":
+            return (
+                http.HTTPStatus.OK,
+                [("Content-Type", "text/plain; version=0.0.4")],
+                self.metrics.render(self).encode(),
+            )
+
+        reason = "STARTING" if not self.ready else self.check_admission()
+        if reason is not None:
+            self.metrics.record_rejected(reason)
+            return (
+                http.HTTPStatus.SERVICE_UNAVAILABLE,
+                [("Retry-After", str(retry_after))],
+                f"{reason}\n".encode(),
+            )
+
+    # returns why a new connection can't be taken, or None if it can
+    def check_admission(self):
+        if len(self.sockets) >= max_connections:
+            return "FULL"
+        if len(self.pending) >= max_pending:
+            return "TOO_MANY_PENDING"
+        return None
 
     # this function fires whenever a client requests the server
     # this will attempt to recieve a logon from the client
     async def client_init(self, socket, path):
+        # more connections can be opened at once than the limits allow,
+        # as they are only checked before each websocket is opened
+        reason = self.check_admission()
+        if reason is not None:
+            self.metrics.record_rejected(reason)
+            await socket.close(1013, reason)
+            return
+
         self.sockets.add(socket)
+        self.pending.add(socket)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + login_timeout
         try:
-            if on_heroku:
-                await asyncio.sleep(2)
-            await socket.send(json.dumps({"TYPE": "CONNECTED"}))
+            await socket.send(connected_frame)
 
             # waits to recieve a login attempt from the client
             # before continuing
             while True:
-                data = json.loads(await socket.recv())
-                if data["TYPE"] == "LOGIN":
+                data = json.loads(
+                    await asyncio.wait_for(
+                        socket.recv(), max(deadline - loop.time(), 0)
+                    )
+                )
+                if data["TYPE"] == "RESUME":
+                    # the client is reconnecting, and wants its old
+                    # session back
+                    client = self.sessions.get(data["DATA"])
+                    if client is not None:
+                        self.pending.discard(socket)
+                        client.resume(socket)
+                        await self.listen(client)
+                        break
+                    # the session has ended, so the client has to log in
+                    await socket.send(resume_failed_frame)
+                elif data["TYPE"] == "LOGIN":
                     if len(data["DATA"]) == 0:
                         # did not supply a name
-                        await socket.send(
-                            json.dumps(
-                                {
-                                    "TYPE": "ERROR",
-                                    "DATA": f"ERROR: Please input a username",
-                                }
-                            )
-                        )
+                        await socket.send(no_name_frame)
                     elif len(data["DATA"]) > 12:
                         # name was too short
-                        await socket.send(
-                            json.dumps(
-                                {
-                                    "TYPE": "ERROR",
-                                    "DATA": "ERROR: Input a shorter name",
-                                }
-                            )
-                        )
+                        await socket.send(long_name_frame)
                     else:
                         # creates client
-                        await self.add_client(socket, path, data["DATA"])
+                        self.pending.discard(socket)
+                        await self.add_client(
+                            socket, path, data["DATA"],
+                            data.get("FEATURES", [])
+                        )
                         break
                 else:
                     # client did not attempt to login. This causes an
                     # error box to popup on the client's GUI
-                    await socket.send(
-                        json.dumps(
-                            {
-                                "TYPE": "ERROR",
-                                "DATA": "ERROR: An unexpected error occured " +
-                                "while attempting to login.",
-                            }
-                        )
-                    )
+                    await socket.send(login_failed_frame)
+
+        # the client didn't log in in time, so the socket is closed to
+        # make room for others
+        except asyncio.TimeoutError:
+            self.metrics.login_timeouts += 1
+            try:
+                await socket.send(login_timeout_frame)
+                await socket.close(1008, "login timed out")
+            except:
+                pass
 
         # this exception fires when the client disconnects prematurely
         # this deals with disconnecting and untracking the websocket
@@ -162,92 +595,111 @@ class Network:
             except:
                 pass
         finally:
+            self.pending.discard(socket)
             if socket in self.sockets:
                 self.sockets.remove(socket)
 
     # this function deals with creating a client class when a login
     # attempt is successful
     # it also deals with future messages and disconnects
-    async def add_client(self, socket, path, name):
-        client = self.Client(self, socket, path, name, "ROOM_LIST")
+    async def add_client(self, socket, path, name, features=()):
+        client = self.Client(self, socket, path, name, "ROOM_LIST", features)
 
-        # this try catches a websocket error, indicating a disconnect
-        try:
+        if client.codec.compact:
+            # the client is sent the type for each numeric code first
+            await client.send_payload(codec_table)
+
+        if "RESUME" in client.features:
+            # the client is given a token it can use to resume
+            client.token = secrets.token_urlsafe(16)
+            self.sessions[client.token] = client
             await client.send(
-                {"TYPE": "LOAD_ROOMS", "DATA": self.rooms.get_room_list()}
+                {
+                    "TYPE": "SESSION",
+                    "DATA": {"TOKEN": client.token, "GRACE": resume_grace},
+                }
             )
 
-            # this is the main listener loop. This loop runs when a
-            # message is recieved from the client
+        await client.send_payload(self.rooms.get_snapshot())
+        await self.listen(client)
+
+    # this is the main listener loop. This loop runs when a message is
+    # recieved from the client, until the client's socket disconnects
+    async def listen(self, client):
+        socket = client.socket
+
+        # this try catches a websocket error, indicating a disconnect
+        try:
             while True:
-                recv = await client.recv()
-                type = recv["TYPE"]
-                if "DATA" in recv:
-                    data = recv["DATA"]
-
-                if type == "CREATE_ROOM":
-                    # client requested to create a room
-                    if len(data) == 0:
-                        await client.error(
-                            "You must create a name for your room"
-                        )
-                        break
-                    if len(data) > 20:
-                        await client.error(
-                            "The room name cannot be more than 20 characters"
-                        )
-                        break
+                frame = await socket.recv()
+                client.last_active = self.scheduler.time()
+                # every frame is counted, including those turned away below
+                self.metrics.record_received(len(frame))
+                if client.closing:
+                    # the client is being disconnected
+                    continue
+                if self.limiter.check_flood(client):
+                    print(f"{client.name} is flooding, disconnecting")
+                    self.dispatcher.count_rejected("FLOODING")
+                    await client.error(
+                        "You are sending messages too quickly", "FLOODING"
+                    )
+                    # the error is sent before the socket is closed, and
+                    # the close reason says why for clients which miss it
+                    client.kick(
+                        1008, "sending messages too quickly", flush=True
+                    )
+                    continue
 
-                    room = await self.rooms.add_room(data)
-                    await room.add_client(client)
-                elif type == "JOIN_ROOM":
-                    # client requested to join a room
-                    if data in self.rooms.rooms:
-                        room = self.rooms.rooms[data]
-                        await room.add_client(client)
-                elif type == "LEAVE_ROOM":
-                    # client requested to leave a room
-                    if client.room is not None:
-                        await client.room.remove_client(client)
-                elif type == "CHANGE_READY":
-                    # client requested to change their ready status
-                    # (inside a room)
-                    room = client.room
-                    if room is not None:
-                        client.ready = data
-                        await room.update_clients()
-                        starting = await room.start_game()
-
-                        if starting:
-                            game = Game(room)
-                            await self.rooms.remove_room(room)
-                            await game.start()
-                elif type == "SUBMIT_GUESS":
-                    # client requested to submit a guess for their
-                    # current game
-                    if client.player is not None and client.game is not None:
-                        current_round = client.game.round_handler.current_round
-                        await current_round.make_guess(
-                            client.player, data
-                        )
-                elif type == "LEAVE_GAME":
-                    # client requested to leave their current game
-                    if client.player is not None and client.game is not None:
-                        await client.game.player_handler.remove_player(
-                            client.player
-                        )
-                        await client.send(
-                            {
-                                "TYPE": "LOAD_ROOMS",
-                                "DATA": self.rooms.get_room_list()
-                            }
-                        )
+                try:
+                    type, data = client.codec.decode(frame)
+                except (
+                    ValueError, TypeError, KeyError, AttributeError,
+                    IndexError
+                ):
+                    # the message isn't a json object with a type, so it
+                    # is turned away without disconnecting the client
+                    await self.dispatcher.reject(
+                        client, None, "MALFORMED",
+                        "Messages must be json objects with a TYPE"
+                    )
+                    continue
+
+                limited = self.limiter.check(client, type)
+                if limited is not None:
+                    await self.dispatcher.reject(
+                        client, type, limited,
+                        "Too many messages of this type"
+                    )
+                    continue
+
+                self.monitor.start_handler(type)
+                start = time.perf_counter()
+                try:
+                    await self.handle_message(client, type, data)
+                finally:
+                    # the monitor stops blaming this message for stalls,
+                    # even if its handler failed
+                    duration = time.perf_counter() - start
+                    self.monitor.finish_handler(type, duration)
+                self.metrics.record_message(type, duration)
 
         except Exception as exception:
+            if client.socket is not socket:
+                # the client has already resumed on a new socket
+                return
+
             traceback.print_exc()
             if exception.__class__.__name__ != "ConnectionClosedOK":
                 # client disconnected from websocket
                 traceback.print_exc()
+
+            if client.is_resumable():
+                # the client keeps its place until it resumes, or its
+                # session expires
+                client.suspend()
+                return
+
             try:
                 # an unexpected error occured. Alerting the client
                 await client.error(exception)
@@ -255,9 +707,151 @@ class Network:
                 pass
             await client.disconnect()
 
+    # returns the number of games currently being played
+    def get_live_games(self):
+        return len(self.games)
+
+    # this deals with a single message from a client, depending on the
+    # type of message
+    async def handle_message(self, client, type, data):
+        handler = await self.dispatcher.get_handler(client, type, data)
+        if handler is None:
+            return
+
+        # messages for a room on another worker are passed on to it
+        if self.worker is not None and client in self.connected:
+            if await self.worker.route_message(client, type, data):
+                return
+
+        await handler(client, data)
+
+    # adds the handler for each type of message, along with the data it
+    # expects
+    def add_handlers(self):
+        register = self.dispatcher.register
+        room_name = Field(
+            str, min_length=1, max_length=20,
+            messages={
+                "TOO_SHORT": "You must create a name for your room",
+                "TOO_LONG": "The room name cannot be more than 20 characters",
+            }
+        )
+        register(
+            "CREATE_ROOM", self.create_room,
+            # the room's name, or an object with its name and the limits
+            # on the phrases its games use
+            Choice(
+                room_name,
+                Field(
+                    dict,
+                    fields={
+                        "NAME": room_name,
+                        "FILTER": Field(
+                            dict, required=False,
+                            fields={
+                                key: Field(int, required=False)
+                                for key in phrase_filters
+                            }
+                        ),
+                    }
+                ),
+            )
+        )
+        register("JOIN_ROOM", self.join_room, Field(str))
+        register("LEAVE_ROOM", self.leave_room)
+        register("CHANGE_READY", self.change_ready, Field(bool))
+        register("SUBMIT_GUESS", self.submit_guess, Field(str))
+        register("LEAVE_GAME", self.leave_game)
+        register("SYNC_ROSTER", self.sync_roster)
+        register("SYNC_ROOMS", self.sync_rooms, Field(int, required=False))
+
+    # client requested to create a room
+    async def create_room(self, client, data):
+        if not self.limiter.allow_room():
+            await client.error(
+                "Too many rooms are being created, please try again soon",
+                "RATE_LIMITED", "CREATE_ROOM"
+            )
+            return
+
+        name, phrase_filter = data, {}
+        if isinstance(data, dict):
+            name = data["NAME"]
+            phrase_filter = {
+                phrase_filters[key]: value
+                for key, value in (data.get("FILTER") or {}).items()
+                if key in phrase_filters and value is not None
+            }
+
+        room = await self.rooms.add_room(name, phrase_filter)
+        await room.add_client(client)
+
+    # client requested to join a room
+    async def join_room(self, client, data):
+        if data in self.rooms.rooms:
+            room = self.rooms.rooms[data]
+            await room.add_client(client)
+
+    # client requested to leave a room
+    async def leave_room(self, client, data):
+        if client.room is not None:
+            await client.room.remove_client(client)
+
+    # client requested to change their ready status (inside a room)
+    async def change_ready(self, client, data):
+        room = client.room
+        if room is not None:
+            client.ready = data
+            await room.update_clients()
+            starting = await room.start_game()
+
+            if starting:
+                # the game isn't stored in a variable here, so nothing
+                # keeps it alive once it ends
+                await self.rooms.remove_room(room)
+                await Game(room).start()
+
+    # client requested to submit a guess for their current game
+    async def submit_guess(self, client, data):
+        if client.player is not None and client.game is not None:
+            await client.game.make_guess(client.player, data)
+
+    # client requested to leave their current game
+    async def leave_game(self, client, data):
+        if client.player is not None and client.game is not None:
+            await client.game.player_handler.remove_player(client.player)
+            await client.send_payload(self.rooms.get_snapshot())
+
+    # client has missed an update to the roster of its game or room, so
+    # it is sent the whole roster
+    async def sync_roster(self, client, data):
+        if client.game is not None:
+            client.game.roster.resync(client)
+            await client.game.update_players()
+        elif client.room is not None:
+            client.room.roster.resync(client)
+            await client.room.update_clients()
+
+    # client sent the version of the room list it has. If it has missed
+    # an update, it is sent the whole list
+    async def sync_rooms(self, client, data):
+        if data != self.rooms.version:
+            await client.send_payload(self.rooms.get_snapshot())
+
+    # returns every client connected to the server in the given location
+    def get_clients(self, location):
+        if location is None:
+            return list(self.connected)
+        return list(self.locations.get(location, ()))
+
+    # returns the number of clients in each location
+    def get_location_counts(self):
+        return {
+            location: len(clients)
+            for location, clients in self.locations.items()
+        }
+
     # used to send data to every client connected to the server
     # has the ability to specify the location of clients to send to
     async def send_all(self, data, location):
-        for client in self.connected:
-            if location is None or client.location == location:
-                await client.send(data)
+        await self.broadcast.send(self.get_clients(location), data)
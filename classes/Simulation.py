@@ -0,0 +1,260 @@
+"""
+SIMULATION CLASS FILE
+this file can be imported by the benchmark file
+it runs games without any real connections or real waiting. Simulated
+clients play against each other through the same network, room and game
+classes the server uses, while time only moves forward when there is
+nothing left to do, so a game that would take minutes finishes instantly
+"""
+
+import asyncio
+import heapq
+import random
+import time
+from classes.ServerNetwork import Network
+from classes.Scheduler import Scheduler
+from classes.Phrases import alphabet, letter_frequency
+
+
+class VirtualScheduler(Scheduler):
+    """
+    a scheduler which runs in simulated time. Nothing is set on the event
+    loop; instead the simulation moves the clock straight to the next
+    timer once everything that is already running has finished
+    """
+    def __init__(self):
+        super().__init__()
+        self.now = 0.0
+        # every task started by a timer which hasn't finished yet
+        self.running = set()
+
+    def time(self):
+        return self.now
+
+    def start(self, timer):
+        task = super().start(timer)
+        self.running.add(task)
+        return task
+
+    def task_done(self, group, task):
+        self.running.discard(task)
+        super().task_done(group, task)
+
+    # the clock is moved by the simulation, so the event loop doesn't
+    # need to be woken up. Cancelled timers are still cleared out
+    def arm(self):
+        while len(self.heap) > 0 and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+
+    # returns true if any task started by a timer is still running
+    def is_busy(self):
+        return len(self.running) > 0
+
+    # moves the clock to the next timer and runs every timer which is
+    # due. Returns false if there are no timers left
+    def advance(self):
+        self.arm()
+        if len(self.heap) == 0:
+            return False
+
+        self.now = max(self.now, self.heap[0][0])
+        self.run_due()
+        return True
+
+
+class MemorySocket:
+    """
+    stands in for a client's websocket. Messages sent to it are counted,
+    rather than being written anywhere. If a record list is given, each
+    message is added to it along with the socket, in the order they were
+    sent
+    """
+    def __init__(self, record=None):
+        self.frames = 0
+        self.bytes = 0
+        self.closed = False
+        self.record = record
+
+    async def send(self, message):
+        self.frames += 1
+        self.bytes += len(message)
+        if self.record is not None:
+            self.record.append((self, message))
+
+    async def close(self, code=1000, reason=""):
+        self.closed = True
+
+
+class RandomGuesser:
+    """
+    guesses a random letter that hasn't been guessed yet. The more of the
+    phrase that has been revealed, the more likely it is to guess the
+    whole phrase instead
+    """
+    def __init__(self, random):
+        self.random = random
+
+    def guess(self, round):
+        solved = round.total_guessed / max(round.phrase.reveal_count, 1)
+        if self.random.random() < solved / 2:
+            return round.phrase.lowered
+
+        return self.random.choice(
+            [
+                letter for letter in alphabet
+                if letter not in round.guessed_letters
+            ]
+        )
+
+
+class ScriptedGuesser:
+    """
+    guesses the letters of a script in order, skipping any that have
+    already been guessed. Once the script runs out, it guesses the phrase
+    """
+    def __init__(self, random, script=letter_frequency):
+        self.script = script
+
+    def guess(self, round):
+        for letter in self.script:
+            if letter not in round.guessed_letters:
+                return letter
+        return round.phrase.lowered
+
+
+class Simulation:
+    """
+    the simulation runs many games at once in simulated time. Each game
+    is made by simulated clients creating and joining a room and readying
+    up, and the clients then take their turns using a guesser until the
+    game finishes, after which they disconnect
+    """
+    def __init__(
+        self, players=2, guesser=RandomGuesser, seed=None, features=(),
+        record=None
+    ):
+        self.players = players
+        self.guesser = guesser
+        # the optional parts of the protocol every simulated client uses
+        self.features = features
+        # every frame sent, if a list is given
+        self.record = record
+        self.random = random.Random(seed)
+        if seed is not None:
+            # the game itself uses the random module for the wheel and
+            # for picking who goes first
+            random.seed(seed)
+
+        self.scheduler = VirtualScheduler()
+        self.network = Network(scheduler=self.scheduler)
+        # simulated players create rooms and guess far faster than real
+        # players could
+        self.network.limiter.enabled = False
+        self.guessers = {}
+        # the clients in each game which is being played
+        self.playing = {}
+
+        self.games_started = 0
+        self.games_finished = 0
+        self.rounds = 0
+        self.guesses = 0
+        self.frames = 0
+        self.bytes = 0
+
+    # creates the clients for a new game, and has them join a room and
+    # ready up, which starts the game
+    async def add_game(self):
+        network = self.network
+        clients = []
+        for number in range(self.players):
+            client = network.Client(
+                network, MemorySocket(self.record), "/",
+                f"bot{self.games_started}-{number}", "ROOM_LIST",
+                self.features
+            )
+            clients.append(client)
+            self.guessers[client] = self.guesser(self.random)
+
+        owner = clients[0]
+        await network.handle_message(
+            owner, "CREATE_ROOM", f"sim{self.games_started}"
+        )
+        room_id = owner.room.id
+        for client in clients[1:]:
+            await network.handle_message(client, "JOIN_ROOM", room_id)
+        for client in clients:
+            await network.handle_message(client, "CHANGE_READY", True)
+
+        self.playing[owner.game] = clients
+        self.games_started += 1
+
+    # has the player whose turn it is make a guess, in every game which
+    # is accepting guesses. Returns true if anyone guessed
+    async def take_turns(self):
+        guessed = False
+        for game in list(self.playing):
+            round = game.round_handler.current_round
+            if game.finished or round is None:
+                continue
+            if round.finished or round.waiting:
+                continue
+
+            client = round.current_player.client
+            guess = self.guessers[client].guess(round)
+            await self.network.handle_message(client, "SUBMIT_GUESS", guess)
+            self.guesses += 1
+            guessed = True
+        return guessed
+
+    # disconnects the clients of every game which has finished
+    async def remove_finished(self):
+        for game in [game for game in self.playing if game.finished]:
+            if game in self.network.games:
+                # the results are still being shown
+                continue
+
+            self.rounds += game.round_handler.total_rounds - 1
+            for client in self.playing.pop(game):
+                self.frames += client.socket.frames
+                self.bytes += client.socket.bytes
+                self.guessers.pop(client)
+                await client.disconnect()
+            self.games_finished += 1
+
+    # lets every running task and writer finish what it is doing
+    async def settle(self):
+        while True:
+            await asyncio.sleep(0)
+            if self.scheduler.is_busy():
+                continue
+            if any(
+                len(client.queue) > 0 or len(client.unsent) > 0
+                for client in self.network.connected
+            ):
+                continue
+            return
+
+    # plays count games, with at most concurrency being played at once.
+    # returns how long it took, in real seconds
+    async def run(self, count, concurrency=100):
+        start = time.perf_counter()
+        while True:
+            while (
+                self.games_started < count and
+                len(self.playing) < concurrency
+            ):
+                await self.add_game()
+
+            await self.settle()
+            if await self.take_turns():
+                await self.settle()
+                continue
+
+            await self.remove_finished()
+            if self.games_finished >= count:
+                break
+            if not self.scheduler.advance() and len(self.playing) > 0:
+                # nobody can guess, and nothing is waiting to happen
+                raise RuntimeError("the simulation has stalled")
+
+        return time.perf_counter() - start
@@ -0,0 +1,373 @@
+"""
+WORKERS CLASS FILE
+this file can be imported by the main server file and the server network
+it handles running the server as several processes (workers) which all
+share the same port. Each room lives on exactly one worker, and the
+workers talk to each other through a coordinator process, over a unix
+socket
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import traceback
+from classes.Codec import get_codec
+
+
+# sends data as a single line of json
+def write_line(writer, data):
+    writer.write(json.dumps(data).encode() + b"\n")
+
+
+class Coordinator:
+    """
+    the coordinator runs in the main process. It stores the state of every
+    room (for the shared backend), including which worker each room lives
+    on, sends it to every worker when it changes, and passes messages
+    between workers
+    """
+    def __init__(self, path):
+        self.path = path
+        self.workers = {}
+        self.rooms = {}
+
+    # starts listening for workers on the unix socket
+    async def start(self):
+        await asyncio.start_unix_server(self.add_worker, path=self.path)
+
+    # this function fires whenever a worker connects. It deals with every
+    # message the worker sends until it disconnects
+    async def add_worker(self, reader, writer):
+        worker = None
+        try:
+            while True:
+                line = await reader.readline()
+                if len(line) == 0:
+                    break
+
+                data = json.loads(line)
+                type = data["OP"]
+                if type == "HELLO":
+                    # a new worker has started
+                    worker = data["WORKER"]
+                    self.workers[worker] = writer
+                    write_line(writer, self.get_rooms())
+                elif type == "ADD_ROOM":
+                    # a worker has created a room
+                    self.rooms[data["HASH"]] = {
+                        "NAME": data["NAME"],
+                        "HASH": data["HASH"],
+                        "WORKER": worker,
+                        "PLAYERS": 0,
+                    }
+                    self.update_rooms()
+                elif type == "PLAYERS":
+                    # the number of players in a room changed. Workers
+                    # are only sent the rooms again if it really has
+                    room = self.rooms.get(data["HASH"])
+                    if room is not None and room["PLAYERS"] != data["PLAYERS"]:
+                        room["PLAYERS"] = data["PLAYERS"]
+                        self.update_rooms()
+                elif type == "REMOVE_ROOM":
+                    # a worker has removed a room
+                    if data["HASH"] in self.rooms:
+                        self.rooms.pop(data["HASH"])
+                        self.update_rooms()
+                elif type == "ROUTE":
+                    # a worker is sending a message to another worker
+                    if data["TO"] in self.workers:
+                        message = data["DATA"]
+                        message["FROM"] = worker
+                        write_line(self.workers[data["TO"]], message)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            # the worker has stopped, so its rooms are no longer available
+            if worker in self.workers:
+                self.workers.pop(worker)
+                for id in [
+                    id for id in self.rooms
+                    if self.rooms[id]["WORKER"] == worker
+                ]:
+                    self.rooms.pop(id)
+                self.update_rooms()
+            writer.close()
+
+    # returns the combined list of rooms on every worker
+    def get_rooms(self):
+        return {"OP": "ROOMS", "DATA": list(self.rooms.values())}
+
+    # sends the combined list of rooms to every worker
+    def update_rooms(self):
+        data = self.get_rooms()
+        for writer in self.workers.values():
+            write_line(writer, data)
+
+
+class Worker:
+    """
+    a worker is one of the server processes. It connects to the
+    coordinator, and routes its clients who join a room on another
+    worker, by passing their messages on to that worker
+    """
+
+    class RemoteClient:
+        """
+        stands in for a client which is connected to another worker, but
+        is in a room on this worker. Anything sent to it is passed back
+        to the worker that the client is connected to
+        """
+        def __init__(self, worker, origin, id, name, features):
+            self.worker = worker
+            self.network = worker.network
+            self.origin, self.id, self.name = origin, id, name
+            self.features = set(features)
+            self.codec = get_codec(self.features)
+            self.game = None
+            self.room = None
+            self.ready = False
+            self.player = None
+            self.detached = False
+            self.current_location = "ROOM_LIST"
+
+        # the location works like a normal client's, but once the client
+        # is back on the room list it is handed back to its own worker
+        @property
+        def location(self):
+            return self.current_location
+
+        @location.setter
+        def location(self, location):
+            self.current_location = location
+            if location == "ROOM_LIST":
+                # this is checked after the current step has finished, as
+                # the client may be moving straight into another room
+                asyncio.get_event_loop().call_soon(
+                    self.worker.check_release, self
+                )
+
+        # causes an error popup to appear on the client's GUI
+        async def error(self, message, code=None, type=None):
+            data = {"TYPE": "ERROR", "DATA": f"ERROR: {message}"}
+            if code is not None:
+                data["CODE"], data["FOR"] = code, type
+            await self.send(data)
+
+        # encodes and sends data to the client
+        async def send(self, data):
+            self.enqueue(self.codec.encode(data), data.get("TYPE"))
+
+        # sends a payload, encoded with the client's codec
+        async def send_payload(self, payload):
+            self.enqueue(payload.encode(self.codec), payload.type)
+
+        # passes an encoded message to the client's own worker, which
+        # adds it to the client's queue
+        def enqueue(self, message, type=None):
+            self.worker.route(
+                self.origin,
+                {
+                    "OP": "SEND",
+                    "CLIENT": self.id,
+                    "MESSAGE": message,
+                    "MESSAGE_TYPE": type,
+                }
+            )
+
+        # removes the client from its game and room on this worker
+        async def disconnect(self):
+            self.detached = True
+            if self.game is not None:
+                await self.game.player_handler.remove_player(self.player)
+            if self.room is not None:
+                await self.room.remove_client(self)
+
+    def __init__(self, network, id, path):
+        self.network = network
+        self.id, self.path = id, path
+        self.writer = None
+
+        # clients connected to this worker who are in a room on another
+        # worker, and clients connected to another worker who are in a
+        # room on this worker
+        self.routed_clients = {}
+        self.remote_clients = {}
+
+    # connects to the coordinator, and starts listening for messages
+    async def connect(self):
+        reader, self.writer = await asyncio.open_unix_connection(self.path)
+        self.send({"OP": "HELLO", "WORKER": self.id})
+        asyncio.ensure_future(self.listen(reader))
+
+    # sends data to the coordinator
+    def send(self, data):
+        write_line(self.writer, data)
+
+    # sends data to another worker, through the coordinator
+    def route(self, worker, data):
+        self.send({"OP": "ROUTE", "TO": worker, "DATA": data})
+
+    # deals with messages from the coordinator until it disconnects.
+    # messages are dealt with one at a time, so they stay in order
+    async def listen(self, reader):
+        while True:
+            line = await reader.readline()
+            if len(line) == 0:
+                print(f"worker {self.id} lost connection to the coordinator")
+                return
+
+            try:
+                await self.handle(json.loads(line))
+            except Exception:
+                traceback.print_exc()
+
+    # deals with a single message from the coordinator
+    async def handle(self, data):
+        type = data["OP"]
+        if type == "ROOMS":
+            # the state of the rooms has changed
+            await self.network.rooms.backend.receive(data["DATA"])
+        elif type == "ATTACH":
+            # a client on another worker is joining a room on this worker
+            client = self.RemoteClient(
+                self, data["FROM"], data["CLIENT"], data["NAME"],
+                data["FEATURES"]
+            )
+            self.remote_clients[(client.origin, client.id)] = client
+            if data["ROOM"] in self.network.rooms.rooms:
+                room = self.network.rooms.rooms[data["ROOM"]]
+                await room.add_client(client)
+            # the room may have been full or already removed
+            self.check_release(client)
+        elif type == "RECV":
+            # a message from a client in a room on this worker
+            key = (data["FROM"], data["CLIENT"])
+            if key in self.remote_clients:
+                await self.network.handle_message(
+                    self.remote_clients[key],
+                    data["MESSAGE_TYPE"],
+                    data["DATA"]
+                )
+        elif type == "DETACH":
+            # a client in a room on this worker has left it, or has
+            # disconnected from their own worker
+            key = (data["FROM"], data["CLIENT"])
+            if key in self.remote_clients:
+                await self.remote_clients.pop(key).disconnect()
+        elif type == "SEND":
+            # a message for a client on this worker, from another worker
+            if data["CLIENT"] in self.routed_clients:
+                self.routed_clients[data["CLIENT"]].enqueue(
+                    data["MESSAGE"], data["MESSAGE_TYPE"]
+                )
+        elif type == "RELEASE":
+            # a client on this worker has gone back to the room list, so
+            # its messages are dealt with on this worker again
+            if data["CLIENT"] in self.routed_clients:
+                client = self.routed_clients.pop(data["CLIENT"])
+                client.remote = None
+                client.location = "ROOM_LIST"
+                # each worker numbers its room list versions separately,
+                # so the client is sent this worker's version of the list
+                await client.send_payload(self.network.rooms.get_snapshot())
+
+    # hands a remote client back to its own worker once it is no longer
+    # in a room or game on this worker
+    def check_release(self, client):
+        if client.detached or client.room is not None:
+            return
+        if client.game is not None:
+            return
+
+        key = (client.origin, client.id)
+        if self.remote_clients.get(key) is client:
+            self.remote_clients.pop(key)
+            self.route(client.origin, {"OP": "RELEASE", "CLIENT": client.id})
+
+    # routes a message from a client on this worker to another worker if
+    # needed. Returns true if the message was routed
+    async def route_message(self, client, type, data):
+        if type == "JOIN_ROOM":
+            worker = self.network.rooms.backend.get_room_worker(data)
+            if worker is not None and worker != self.id:
+                # the room is on another worker
+                self.detach(client)
+                if client.room is not None:
+                    await client.room.remove_client(client)
+                self.attach(client, worker, data)
+                return True
+
+        if type in ("JOIN_ROOM", "CREATE_ROOM"):
+            # the client is moving into a room on this worker
+            self.detach(client)
+            return False
+
+        if client.remote is not None:
+            self.route(
+                client.remote,
+                {
+                    "OP": "RECV",
+                    "CLIENT": client.id,
+                    "MESSAGE_TYPE": type,
+                    "DATA": data,
+                }
+            )
+            return True
+
+        return False
+
+    # moves a client on this worker into a room on another worker
+    def attach(self, client, worker, room_id):
+        client.remote = worker
+        client.location = "REMOTE"
+        self.routed_clients[client.id] = client
+        self.route(
+            client.remote,
+            {
+                "OP": "ATTACH",
+                "CLIENT": client.id,
+                "NAME": client.name,
+                "FEATURES": list(client.features),
+                "ROOM": room_id,
+            }
+        )
+
+    # removes a client on this worker from the room it was routed to
+    def detach(self, client):
+        if client.remote is None:
+            return
+
+        self.route(client.remote, {"OP": "DETACH", "CLIENT": client.id})
+        self.routed_clients.pop(client.id, None)
+        client.remote = None
+        client.location = "ROOM_LIST"
+
+
+# runs a single worker process
+def run_worker(id, ip, port, path):
+    # imported here, as the server network imports this file
+    from classes.ServerNetwork import Network
+
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    network = Network(ip, port, worker_id=id, coordinator_path=path)
+    network.bind()
+
+
+# runs the coordinator in this process, and starts count worker
+# processes which all share the same port
+def run(ip, port, count):
+    path = os.path.join(tempfile.mkdtemp(), "coordinator.sock")
+
+    coordinator = Coordinator(path)
+    asyncio.get_event_loop().run_until_complete(coordinator.start())
+
+    context = multiprocessing.get_context("spawn")
+    for id in range(count):
+        context.Process(
+            target=run_worker, args=(id, ip, port, path), daemon=True
+        ).start()
+
+    print(f"started {count} workers")
+    asyncio.get_event_loop().run_forever()
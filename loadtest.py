@@ -0,0 +1,580 @@
+"""
+Load test file responsible for measuring the server under real load
+this file starts a server, connects bot clients to it over real
+websockets, and has them play games using the same messages as the
+frontend. The number of bots goes up in stages, and each stage reports
+how quickly bots connected, how long messages took to be answered, and
+how much cpu and memory the server used
+this file is run by hand, and is not used when the server is deployed
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import websockets
+from classes.Codec import message_types
+from classes.Phrases import alphabet, letter_frequency
+
+# how long (in seconds) a table waits for the server to answer one of its
+# requests before the table counts as stalled
+reply_timeout = 10
+# how long (in seconds) a table first waits before creating its room
+# again when the server turns it away, and the longest it waits
+retry_delay = 0.5
+max_retry_delay = 8
+
+
+# returns the value below which the given percentage of values fall
+def percentile(values, percent):
+    if len(values) == 0:
+        return 0
+    values = sorted(values)
+    index = min(int(len(values) * percent / 100), len(values) - 1)
+    return values[index]
+
+
+# turns a message sent with the compact codec back into the original
+# format, for the types bots read. Other types keep their first value as
+# their data
+def unpack(message):
+    type, values = message_types[message[0]], message[1:]
+    if type == "JOINED_ROOM":
+        data = {"HASH": values[0], "NAME": values[1]}
+    elif type == "GAME_CONNECTED_UPDATE":
+        rows, you = values
+        data = {
+            str(index): {"YOU": index == you, "IS_TURN": row[2]}
+            for index, row in enumerate(rows)
+        }
+    elif type == "GAME_ROSTER":
+        data = {"YOU": values[1], "TURN": values[2]}
+    elif type == "UPDATE_PHRASE":
+        data = f"{values[0]} guessedletters: {', '.join(values[1])}"
+    elif type == "ERROR" and len(values) > 1:
+        return {
+            "TYPE": type, "DATA": values[0],
+            "CODE": values[1], "FOR": values[2],
+        }
+    else:
+        data = values[0] if len(values) > 0 else None
+    return {"TYPE": type, "DATA": data}
+
+
+class ServerProcess:
+    """
+    the server being tested, started as a separate process. Its cpu time
+    and memory are read from /proc (so are only known on linux),
+    including any worker processes
+    """
+    def __init__(self, verbose=False):
+        # the server prints every disconnect, which would bury the results
+        output = None if verbose else subprocess.DEVNULL
+        self.process = subprocess.Popen(
+            [sys.executable, "server.py"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=output,
+            stderr=output,
+        )
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+
+    # returns the ids of the server process and its worker processes
+    def get_pids(self):
+        pids = [self.process.pid]
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat") as file:
+                    fields = file.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == self.process.pid:
+                pids.append(int(name))
+        return pids
+
+    # returns the total cpu time (in seconds) and memory (in bytes) used
+    # by the server's processes
+    def get_usage(self):
+        cpu, memory = 0, 0
+        if not os.path.isdir("/proc"):
+            return cpu, memory
+
+        for pid in self.get_pids():
+            try:
+                with open(f"/proc/{pid}/stat") as file:
+                    fields = file.read().rsplit(")", 1)[1].split()
+                with open(f"/proc/{pid}/statm") as file:
+                    pages = int(file.read().split()[1])
+            except OSError:
+                continue
+            # utime and stime are the 14th and 15th fields of the file
+            cpu += (int(fields[11]) + int(fields[12])) / self.ticks
+            memory += pages * self.page_size
+        return cpu, memory
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+class Bot:
+    """
+    a single simulated player. It logs in, joins rooms and plays games
+    when its table tells it to, and checks how long the server takes to
+    answer by asking for the room list every so often
+    """
+    def __init__(self, tester, number):
+        self.tester = tester
+        self.name = f"bot{number}"
+        self.socket = None
+        self.location = "ROOM_LIST"
+        self.finished = False
+        self.my_turn = False
+        self.you = None
+        self.guessed = set()
+        # futures waiting on a message type, which are resolved when a
+        # message of that type arrives
+        self.expected = {}
+        self.probe_sent = None
+
+    # connects and logs in, and returns how long it took
+    async def connect(self, url):
+        start = time.perf_counter()
+        self.socket = await websockets.connect(url, max_queue=None)
+        await self.socket.recv()
+        login = {"TYPE": "LOGIN", "DATA": self.name}
+        if len(self.tester.features) > 0:
+            login["FEATURES"] = self.tester.features
+        waiting = self.expect("LOAD_ROOMS")
+        await self.socket.send(json.dumps(login))
+        asyncio.ensure_future(self.listen())
+        await waiting
+        return time.perf_counter() - start
+
+    async def send(self, type, data=None):
+        try:
+            await self.socket.send(json.dumps({"TYPE": type, "DATA": data}))
+        except websockets.ConnectionClosed:
+            pass
+
+    # returns a future which is resolved by the next message of the type
+    def expect(self, type):
+        future = asyncio.get_event_loop().create_future()
+        self.expected.setdefault(type, []).append(future)
+        return future
+
+    # stops waiting on a future returned by expect
+    def forget(self, type, future):
+        future.cancel()
+        waiting = self.expected.get(type, [])
+        if future in waiting:
+            waiting.remove(future)
+
+    # sends a message and waits for the reply of the given type. Returns
+    # the reply's data, or None if the server turned the message away,
+    # such as when rooms are being created too quickly. Raises a timeout
+    # error if the server doesn't answer in time
+    async def request(self, type, data, reply):
+        replied = self.expect(reply)
+        refused = self.expect(("REFUSED", type))
+        await self.send(type, data)
+        done, _ = await asyncio.wait(
+            [replied, refused], timeout=reply_timeout,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        self.forget(reply, replied)
+        self.forget(("REFUSED", type), refused)
+        if replied in done:
+            return replied.result()
+        if refused in done:
+            return None
+        raise asyncio.TimeoutError()
+
+    # leaves the bot's room or game, if it is in one. Both are left, as
+    # the bot may have been moved into a game it hasn't heard about yet.
+    # the server deals with a client's messages in order, so anything
+    # sent after this is dealt with once the bot is back on the room list
+    async def leave(self):
+        if self.location != "ROOM_LIST":
+            await self.send("LEAVE_GAME")
+            await self.send("LEAVE_ROOM")
+        self.location = "ROOM_LIST"
+
+    # reads messages from the server until the connection closes
+    async def listen(self):
+        try:
+            async for frame in self.socket:
+                self.tester.received += 1
+                data = json.loads(frame)
+                # a batch is an array of messages, and compact messages
+                # are arrays starting with their type's code
+                if not isinstance(data, list) or isinstance(data[0], int):
+                    data = [data]
+                for message in data:
+                    if isinstance(message, list):
+                        message = unpack(message)
+                    self.handle(message)
+        except websockets.ConnectionClosed:
+            pass
+        self.tester.disconnected += 1
+
+    # keeps track of the game from the messages the server sends. The
+    # room list doesn't change where the bot is, as it is also the answer
+    # to the bot's own requests for it, and the two can arrive as one
+    # message. Bots leave their room or game themselves instead
+    def handle(self, message):
+        type, data = message["TYPE"], message.get("DATA")
+        if type == "LOAD_ROOMS" and self.probe_sent is not None:
+            # the answer to the room list request
+            self.tester.round_trips.append(
+                time.perf_counter() - self.probe_sent
+            )
+            self.probe_sent = None
+
+        # the keys of the futures this message resolves
+        keys = [type]
+        if type == "JOINED_ROOM":
+            self.location = "ROOM"
+        elif type == "JOINED_GAME":
+            self.location = "GAME"
+            self.finished = False
+            self.my_turn = False
+        elif type == "GAME_CONNECTED_UPDATE":
+            self.my_turn = any(
+                player["YOU"] and player["IS_TURN"]
+                for player in data.values()
+            )
+        elif type == "GAME_ROSTER":
+            self.you = data["YOU"]
+            self.my_turn = data["TURN"] == self.you
+        elif type == "GAME_ROSTER_DELTA":
+            if "TURN" in data:
+                self.my_turn = data["TURN"] == self.you
+        elif type == "UPDATE_PHRASE":
+            letters = data.rsplit("guessedletters: ", 1)[-1]
+            self.guessed = set(letters.split(", "))
+        elif type == "GAME_MESSAGE" and data.startswith("GAME FINISHED"):
+            self.finished = True
+            keys.append("GAME_FINISHED")
+        elif type == "ERROR":
+            self.tester.errors += 1
+            keys.append(("REFUSED", message.get("FOR")))
+        elif type == "REJECTED":
+            # such as guessing while the wheel is spinning, which bots do
+            # as they don't wait for it
+            self.tester.rejected += 1
+            keys.append(("REFUSED", data.get("FOR")))
+
+        for key in keys:
+            for future in self.expected.pop(key, []):
+                if not future.done():
+                    future.set_result(data)
+
+    # takes the bot's turn when it is their go, and checks the round trip
+    # time every so often. Runs until the bot is closed
+    async def play(self):
+        next_probe = time.perf_counter() + random.random()
+        while not self.socket.closed:
+            await asyncio.sleep(self.tester.think_time)
+
+            if self.location == "GAME" and self.my_turn:
+                if not self.finished:
+                    await self.send("SUBMIT_GUESS", self.pick_letter())
+
+            now = time.perf_counter()
+            if now >= next_probe and self.probe_sent is None:
+                if self.location != "ROOM_LIST" and not self.finished:
+                    self.probe_sent = now
+                    await self.send("SYNC_ROOMS", -1)
+                next_probe = now + self.tester.probe_interval
+
+    # picks a letter which hasn't been guessed yet, mostly in the order
+    # letters are most common
+    def pick_letter(self):
+        letters = [
+            letter for letter in letter_frequency
+            if letter not in self.guessed
+        ]
+        if len(letters) == 0:
+            return random.choice(alphabet)
+        if random.random() < 0.2:
+            return random.choice(letters)
+        return letters[0]
+
+
+class Table:
+    """
+    a group of bots who play games together, one after another. The
+    first bot creates a room, the others join it, and they all ready up.
+    once the game has finished, everyone leaves it straight away. A table
+    which the server doesn't answer in time counts as stalled, and starts
+    again
+    """
+    def __init__(self, tester, bots):
+        self.tester = tester
+        self.bots = bots
+
+    async def run(self):
+        while True:
+            try:
+                await self.start_game()
+            except asyncio.TimeoutError:
+                self.tester.stalled += 1
+                for bot in self.bots:
+                    await bot.leave()
+                continue
+
+            await asyncio.gather(
+                *[bot.expect("GAME_FINISHED") for bot in self.bots]
+            )
+            for bot in self.bots:
+                await bot.leave()
+            # a short break before the next game
+            await asyncio.sleep(random.random())
+
+    # creates a room, and has every bot join it and ready up
+    async def start_game(self):
+        room = await self.create_room()
+        await asyncio.gather(
+            *[
+                bot.request("JOIN_ROOM", room["HASH"], "JOINED_ROOM")
+                for bot in self.bots[1:]
+            ]
+        )
+        await asyncio.gather(
+            *[
+                bot.request("CHANGE_READY", True, "JOINED_GAME")
+                for bot in self.bots
+            ]
+        )
+
+    # creates the table's room. The server turns rooms away when too many
+    # are being created at once, so it tries again after a while, waiting
+    # longer each time
+    async def create_room(self):
+        owner = self.bots[0]
+        delay = retry_delay
+        while True:
+            room = await owner.request(
+                "CREATE_ROOM", f"load {owner.name}", "JOINED_ROOM"
+            )
+            if room is not None:
+                return room
+
+            self.tester.retries += 1
+            await asyncio.sleep(delay * (1 + random.random()))
+            delay = min(delay * 2, max_retry_delay)
+
+
+class LoadTester:
+    """
+    adds bots in stages, and measures the server at each stage
+    """
+    def __init__(self, arguments):
+        self.url = arguments.url
+        self.players = arguments.players
+        self.features = [
+            feature for feature in arguments.features.split(",")
+            if len(feature) > 0
+        ]
+        self.think_time = arguments.think_time
+        self.probe_interval = arguments.probe_interval
+        self.connect_limit = asyncio.Semaphore(arguments.connect_concurrency)
+
+        self.bots = []
+        self.tasks = []
+        self.round_trips = []
+        self.received = 0
+        self.errors = 0
+        self.rejected = 0
+        # rooms which had to be created again, and tables which stopped
+        # getting answers from the server
+        self.retries = 0
+        self.stalled = 0
+        self.failed = 0
+        self.disconnected = 0
+
+    # connects a single bot, and returns how long it took, or None if it
+    # couldn't connect
+    async def connect_bot(self, bot):
+        async with self.connect_limit:
+            try:
+                return await bot.connect(self.url)
+            except Exception:
+                self.failed += 1
+                return None
+
+    # connects enough new bots to bring the total up to count, and sits
+    # them at tables. Returns how long each bot took to connect
+    async def add_bots(self, count):
+        bots = [
+            Bot(self, number) for number in range(len(self.bots), count)
+        ]
+        times = await asyncio.gather(*[self.connect_bot(bot) for bot in bots])
+        bots = [bot for bot, taken in zip(bots, times) if taken is not None]
+        self.bots.extend(bots)
+
+        for index in range(0, len(bots) - self.players + 1, self.players):
+            table = Table(self, bots[index:index + self.players])
+            self.tasks.append(asyncio.ensure_future(table.run()))
+        for bot in bots:
+            self.tasks.append(asyncio.ensure_future(bot.play()))
+
+        return [taken for taken in times if taken is not None]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(
+            *[bot.socket.close() for bot in self.bots],
+            return_exceptions=True
+        )
+
+
+# waits until the server is accepting connections
+async def wait_for_server(url, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            socket = await websockets.connect(url)
+            await socket.close()
+            return
+        except (OSError, websockets.InvalidStatusCode):
+            # the server turns connections away until it is ready
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def load_test(arguments, server):
+    await wait_for_server(arguments.url)
+    tester = LoadTester(arguments)
+    stages = [int(stage) for stage in arguments.stages.split(",")]
+    baseline = None
+    degraded = None
+
+    print(
+        "bots  conn/s  conn p95  rtt p50  rtt p95  rtt p99  " +
+        "msgs/s  errors  rejected  stalled  cpu%   rss"
+    )
+    try:
+        for stage in stages:
+            start = time.perf_counter()
+            connect_times = await tester.add_bots(stage)
+            connect_rate = len(connect_times) / (time.perf_counter() - start)
+
+            # the stage is measured once everyone has connected
+            tester.round_trips.clear()
+            received, errors = tester.received, tester.errors
+            rejected, stalled = tester.rejected, tester.stalled
+            if server is not None:
+                cpu, memory = server.get_usage()
+            start = time.perf_counter()
+            await asyncio.sleep(arguments.stage_time)
+            elapsed = time.perf_counter() - start
+
+            cpu_percent, memory_mb = 0, 0
+            if server is not None:
+                new_cpu, memory = server.get_usage()
+                cpu_percent = (new_cpu - cpu) / elapsed * 100
+                memory_mb = memory / 1024 / 1024
+
+            round_trips = [value * 1000 for value in tester.round_trips]
+            p95 = percentile(round_trips, 95)
+            print(
+                f"{len(tester.bots):<6}"
+                f"{connect_rate:<8.0f}"
+                f"{percentile(connect_times, 95) * 1000:<10.1f}"
+                f"{percentile(round_trips, 50):<9.1f}"
+                f"{p95:<9.1f}"
+                f"{percentile(round_trips, 99):<9.1f}"
+                f"{(tester.received - received) / elapsed:<8.0f}"
+                f"{tester.errors - errors:<8}"
+                f"{tester.rejected - rejected:<10}"
+                f"{tester.stalled - stalled:<9}"
+                f"{cpu_percent:<7.0f}"
+                f"{memory_mb:.0f}MB"
+            )
+
+            # latency has degraded once the slowest round trips are both
+            # over the threshold and several times slower than at first.
+            # a table which stalled means the server has stopped coping
+            if baseline is None:
+                baseline = p95
+            if degraded is None and (
+                p95 > max(
+                    arguments.threshold, baseline * arguments.degrade_factor
+                ) or
+                tester.stalled > stalled
+            ):
+                degraded = len(tester.bots)
+    finally:
+        await tester.close()
+
+    if tester.failed > 0:
+        print(f"{tester.failed} bots could not connect")
+    if tester.retries > 0:
+        print(f"{tester.retries} rooms were turned away and created again")
+    if tester.stalled > 0:
+        print(f"{tester.stalled} tables stalled waiting for the server")
+    if degraded is None:
+        print(f"latency did not degrade up to {len(tester.bots)} bots")
+    else:
+        print(f"latency degraded at {degraded} bots")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="plays games on a server with bot clients, and " +
+        "measures how it copes as more bots are added"
+    )
+    parser.add_argument("--url", default="ws://localhost:5555")
+    parser.add_argument(
+        "--no-server", action="store_true",
+        help="test a server which is already running at the url"
+    )
+    parser.add_argument("--stages", default="50,100,200,400,800,1600")
+    parser.add_argument("--stage-time", type=float, default=10)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument(
+        "--features", default="",
+        help="comma separated features the bots ask for when logging in"
+    )
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--probe-interval", type=float, default=1)
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument(
+        "--threshold", type=float, default=100,
+        help="the 95th percentile round trip (in ms) treated as degraded"
+    )
+    parser.add_argument("--degrade-factor", type=float, default=4)
+    parser.add_argument(
+        "--verbose", action="store_true", help="show the server's output"
+    )
+    arguments = parser.parse_args()
+
+    # every bot needs its own file descriptor, as does the server for
+    # each of them
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    server = None
+    if not arguments.no_server:
+        server = ServerProcess(arguments.verbose)
+    try:
+        asyncio.run(load_test(arguments, server))
+    finally:
+        if server is not None:
+            server.stop()
+
+
+# only runs if the file has not been imported
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,17 @@ import os
 from os import environ
 from classes.Game import Game
 from classes.ServerNetwork import Network
+from classes import Workers
 
 # testing environment variables to see if server has been deployed
 on_heroku = False
 if "RUNNING_ON_HEROKU" in os.environ:
     on_heroku = True
 
+# the number of processes to run the server on. Each process uses its own
+# cpu core, and they all share the same port
+workers = int(environ.get("WORKERS", 1))
+
 """
 this function runs when the server is deployed.
 It starts and binds the network. However due to the nature of websockets
@@ -22,10 +27,14 @@ none of the functionality can be in this file
 
 
 def main():
-    network = Network(
-        "0.0.0.0" if on_heroku else "localhost",
-        environ.get("PORT") if on_heroku else 5555,
-    )
+    ip = "0.0.0.0" if on_heroku else "localhost"
+    port = environ.get("PORT") if on_heroku else 5555
+
+    if workers > 1:
+        Workers.run(ip, port, workers)
+        return
+
+    network = Network(ip, port)
     network.bind()
 
 
@@ -0,0 +1,107 @@
+"""
+Regression test for games being cleaned up once they finish
+this file plays hundreds of simulated games in batches, and checks that
+nothing from a finished game is kept: the network forgets the game, no
+game objects survive garbage collection, and the memory used stops
+growing between batches. It also checks that games are freed when every
+player leaves part way through a round
+this file is run with python -m unittest
+"""
+
+import asyncio
+import contextlib
+import gc
+import io
+import tracemalloc
+import unittest
+from classes.Game import Game
+from classes.Simulation import Simulation
+
+# how many games are played in each batch, and how many batches are played
+batch_size = 100
+batches = 4
+# how many games are left by every player part way through a round
+abandoned = 20
+# how much (in bytes) the memory used can grow between batches, once the
+# first batch has filled the caches which are kept for good
+max_growth = 64 * 1024
+
+
+class GameLifecycleTest(unittest.TestCase):
+    """
+    plays batches of games with a single simulation, checking what is left
+    behind after each batch
+    """
+    def setUp(self):
+        tracemalloc.start()
+
+    def tearDown(self):
+        tracemalloc.stop()
+
+    # returns the games which are still in memory
+    def get_games(self):
+        gc.collect()
+        return [game for game in gc.get_objects() if isinstance(game, Game)]
+
+    # returns true if a game's current round has had a correct guess, and
+    # hasn't finished
+    def mid_round(self, game):
+        round = game.round_handler.current_round
+        if round is None or round.finished:
+            return False
+        return round.total_guessed > 0
+
+    # plays every batch, and returns the memory used after each one
+    async def play(self):
+        simulation = Simulation(seed=1)
+        sizes = []
+        for batch in range(1, batches + 1):
+            await simulation.run(batch * batch_size)
+
+            self.assertEqual(simulation.games_finished, batch * batch_size)
+            self.assertEqual(len(simulation.network.games), 0)
+            self.assertEqual(self.get_games(), [])
+            sizes.append(tracemalloc.get_traced_memory()[0])
+        return sizes
+
+    # starts some games, and has every player in a game leave as soon as
+    # the game is part way through a round
+    async def abandon(self):
+        simulation = Simulation(seed=1)
+        for _ in range(abandoned):
+            await simulation.add_game()
+        await simulation.settle()
+
+        while len(simulation.playing) > 0:
+            leaving = [
+                simulation.playing.pop(game)
+                for game in list(simulation.playing) if self.mid_round(game)
+            ]
+            for clients in leaving:
+                for client in clients:
+                    await client.disconnect()
+            await simulation.settle()
+
+            if not await simulation.take_turns():
+                simulation.scheduler.advance()
+            await simulation.settle()
+
+        self.assertEqual(len(simulation.network.games), 0)
+        self.assertEqual(len(simulation.network.locations["GAME"]), 0)
+        self.assertEqual(self.get_games(), [])
+
+    def test_finished_games_are_freed(self):
+        # the server prints every disconnect
+        with contextlib.redirect_stdout(io.StringIO()):
+            sizes = asyncio.run(self.play())
+
+        for before, after in zip(sizes[1:], sizes[2:]):
+            self.assertLess(after - before, max_growth)
+
+    def test_abandoned_games_are_freed(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(self.abandon())
+
+
+if __name__ == "__main__":
+    unittest.main()